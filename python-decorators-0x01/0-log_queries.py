@@ -1,16 +1,40 @@
 import sqlite3
 import functools
-from datetime import datetime
+import time
+
+import query_log
+import slow_queries
+from sql_parse import fingerprint
 
 #### decorator to log SQL queries
 def log_queries(func):
+    """Decorator that times each query and sends a structured record to query_log
+
+    Records carry the query fingerprint (literals replaced by ?), duration,
+    row count and error, and are written by a background thread so the
+    caller never waits on log I/O. query_log.configure() sets the sample
+    rate; query_log.dump_histograms() prints per-fingerprint latencies.
+    With slow_queries.enable(), slow queries also get their plan captured.
+    """
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
         # check if query is passed as first positional arg or keyword
         query = kwargs.get("query") if "query" in kwargs else args[0] if args else None
-        if query:
-            print(f"[{datetime.now()}] Executing SQL Query: {query}")
-        return func(*args, **kwargs)
+        if not query:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            query_log.record(fingerprint(query), time.perf_counter() - start, error=e)
+            raise
+        duration = time.perf_counter() - start
+        rows = len(result) if isinstance(result, (list, tuple)) else None
+        shape = fingerprint(query)
+        query_log.record(shape, duration, rows)
+        conn = next((a for a in args if isinstance(a, sqlite3.Connection)), None)
+        slow_queries.check(query, duration, conn, fingerprint=shape)
+        return result
     return wrapper
 
 
@@ -25,5 +49,7 @@ def fetch_all_users(query):
 
 
 #### fetch users while logging the query
-users = fetch_all_users(query="SELECT * FROM users")
-print(users)
+if __name__ == "__main__":
+    users = fetch_all_users(query="SELECT * FROM users")
+    print(users)
+    query_log.dump_histograms()
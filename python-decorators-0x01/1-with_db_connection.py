@@ -1,15 +1,17 @@
-import sqlite3 
 import functools
 
+from db_connection import get_manager
+
 def with_db_connection(func):
-    """Decorator that opens a DB connection, passes it to the function, and closes it after"""
+    """Decorator that passes this thread's long-lived DB connection to the function"""
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = sqlite3.connect("users.db")
+        manager = get_manager()
+        conn = manager.acquire()
         try:
             result = func(conn, *args, **kwargs)
         finally:
-            conn.close()
+            manager.release(conn)
         return result
     return wrapper
 
@@ -19,6 +21,6 @@ def get_user_by_id(conn, user_id):
     cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,)) 
     return cursor.fetchone() 
 #### Fetch user by ID with automatic connection handling 
-
-user = get_user_by_id(user_id=1)
-print(user)
\ No newline at end of file
+if __name__ == "__main__":
+    user = get_user_by_id(user_id=1)
+    print(user)
\ No newline at end of file
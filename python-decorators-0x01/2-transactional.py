@@ -1,30 +1,70 @@
-import sqlite3 
 import functools
+import itertools
+
+from db_connection import get_manager
+from table_events import WriteTracker, publish
 
 def with_db_connection(func):
-    """Decorator that opens a DB connection, passes it to the function, and closes it after"""
+    """Decorator that passes this thread's long-lived DB connection to the function"""
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = sqlite3.connect("users.db")
+        manager = get_manager()
+        conn = manager.acquire()
         try:
             result = func(conn, *args, **kwargs)
         finally:
-            conn.close()
+            manager.release(conn)
         return result
     return wrapper
 
 
-def transactional(func):
-    """Decorator that ensures a function runs inside a transaction"""
+MODES = ("DEFERRED", "IMMEDIATE", "EXCLUSIVE")
+_savepoints = itertools.count()
+
+
+def transactional(func=None, *, mode="DEFERRED"):
+    """Decorator that ensures a function runs inside a transaction
+
+    The outermost call opens the transaction with BEGIN <mode> and commits
+    it; use @transactional(mode="IMMEDIATE") to take the write lock up
+    front. A call made while the connection is already in a transaction
+    runs under a SAVEPOINT instead: its failure rolls back only its own
+    work, and the whole unit of work still costs a single commit.
+
+    Tables written by a committed transaction are published through
+    table_events so caches reading them can drop stale results.
+    """
+    mode = mode.upper()
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}, not {mode!r}")
+    if func is None:
+        return lambda f: transactional(f, mode=mode)
+
     @functools.wraps(func)
     def wrapper(conn, *args, **kwargs):
+        if conn.in_transaction:
+            savepoint = f"transactional_{next(_savepoints)}"
+            conn.execute(f"SAVEPOINT {savepoint}")
+            try:
+                result = func(conn, *args, **kwargs)
+            except Exception:
+                conn.execute(f"ROLLBACK TO {savepoint}")
+                conn.execute(f"RELEASE {savepoint}")
+                raise
+            conn.execute(f"RELEASE {savepoint}")
+            return result
+
         try:
-            result = func(conn, *args, **kwargs)
+            with WriteTracker(conn) as writes:
+                conn.execute(f"BEGIN {mode}")
+                result = func(conn, *args, **kwargs)
             conn.commit()
-            return result
         except Exception as e:
-            conn.rollback()
+            if conn.in_transaction:
+                conn.rollback()
             raise e
+        publish(writes.changed())
+        return result
     return wrapper
 
 @with_db_connection 
@@ -34,4 +74,5 @@ def update_user_email(conn, user_id, new_email):
     cursor.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id)) 
 
 #### Update user's email with automatic transaction handling 
-update_user_email(user_id=1, new_email='Crawford_Cartwright@hotmail.com')
\ No newline at end of file
+if __name__ == "__main__":
+    update_user_email(user_id=1, new_email='Crawford_Cartwright@hotmail.com')
\ No newline at end of file
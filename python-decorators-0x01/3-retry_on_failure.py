@@ -1,37 +1,206 @@
 import time
+import random
 import sqlite3 
 import functools
+import threading
+
+from db_connection import get_manager
 
 #### with_db_connection decorator
 def with_db_connection(func):
-    """Decorator that opens a DB connection, passes it to the function, and closes it after"""
+    """Decorator that passes this thread's long-lived DB connection to the function"""
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = sqlite3.connect("users.db")
+        manager = get_manager()
+        conn = manager.acquire()
         try:
             result = func(conn, *args, **kwargs)
         finally:
-            conn.close()
+            manager.release(conn)
         return result
     return wrapper
 
 
+#### failure classification, retry budget and circuit breaker
+# sqlite3 error messages caused by contention, not by the query
+RETRYABLE_MESSAGES = ("database is locked", "database table is locked")
+# sqlite3 error messages meaning the database itself cannot be used
+UNAVAILABLE_MESSAGES = ("unable to open database", "disk i/o error",
+                        "database disk image is malformed", "database or disk is full",
+                        "file is not a database")
+CONTENTION, UNAVAILABLE, CALLER_ERROR = "contention", "unavailable", "caller"
+MAX_DELAY = 30.0            # Seconds, cap on a single backoff
+BUDGET_RATIO = 0.2          # Retries allowed per call made, across all callers
+BUDGET_MIN_PER_SECOND = 1.0  # Retries always allowed regardless of traffic
+FAILURE_THRESHOLD = 5       # Consecutive failed attempts that open the circuit
+RESET_TIMEOUT = 30.0        # Seconds the circuit stays open before a trial call
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the backend while the circuit is open"""
+
+
+def classify(exc):
+    """
+    Sort an exception into one of three kinds:
+    CONTENTION: transient lock contention; retried with backoff, and never
+        counted against the backend, since opening the circuit would only
+        turn a busy database into an unavailable one
+    UNAVAILABLE: the database cannot be opened or read; retried and counted
+        toward the circuit breaker
+    CALLER_ERROR: syntax errors, constraint violations, missing tables and
+        anything else; raised at once and neutral for the breaker
+    """
+    if isinstance(exc, sqlite3.DatabaseError):
+        message = str(exc).lower()
+        if any(text in message for text in RETRYABLE_MESSAGES):
+            return CONTENTION
+        if any(text in message for text in UNAVAILABLE_MESSAGES):
+            return UNAVAILABLE
+    elif isinstance(exc, OSError):
+        return UNAVAILABLE
+    return CALLER_ERROR
+
+
+def is_retryable(exc):
+    """True for errors worth another attempt (contention or an unavailable backend)"""
+    return classify(exc) != CALLER_ERROR
+
+
+class RetryBudget:
+    """Token bucket shared by every caller that limits retries to a fraction of calls
+
+    Each call deposits `ratio` tokens and each retry withdraws one, so when
+    the backend struggles the total load is at most (1 + ratio) times the
+    normal load instead of `retries` times. `min_per_second` tokens are
+    added over time so low-traffic callers can still retry.
+    """
+
+    def __init__(self, ratio=BUDGET_RATIO, min_per_second=BUDGET_MIN_PER_SECOND, capacity=10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, amount):
+        now = time.monotonic()
+        amount += (now - self._updated) * self.min_per_second
+        self._updated = now
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def deposit(self):
+        with self._lock:
+            self._refill(self.ratio)
+
+    def withdraw(self):
+        """Take one retry from the budget; False if it is exhausted"""
+        with self._lock:
+            self._refill(0.0)
+            if self.tokens < 1.0:
+                return False
+            self.tokens -= 1.0
+            return True
+
+
+class CircuitBreaker:
+    """Fails calls fast once the backend has failed FAILURE_THRESHOLD times in a row
+
+    closed: calls go through. open: calls raise CircuitOpenError until
+    reset_timeout has passed. half-open: a single trial call goes through;
+    its success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError("Circuit open: backend failing, not calling it")
+                self.state = "half-open"
+            if self.state == "half-open":
+                if self._trial_running:
+                    raise CircuitOpenError("Circuit half-open: trial call in progress")
+                self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_running = False
+
+    def record_neutral(self):
+        """The call failed for its own reasons; says nothing about the backend"""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == "half-open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+default_budget = RetryBudget()
+default_breaker = CircuitBreaker()
+
+
+def backoff(attempt, delay, max_delay=MAX_DELAY):
+    """Full-jitter exponential backoff: uniform in [0, min(max_delay, delay * 2**(attempt-1))]"""
+    return random.uniform(0, min(max_delay, delay * 2 ** (attempt - 1)))
+
+
 #### retry_on_failure decorator
-def retry_on_failure(retries=3, delay=2):
-    """Decorator that retries a function call if it raises an exception"""
+def retry_on_failure(retries=3, delay=2, max_delay=MAX_DELAY, classify=classify,
+                     budget=None, breaker=None):
+    """Decorator that retries a function call if it raises a retryable exception
+
+    :param retries: Attempts in total, including the first
+    :param delay: Base backoff in seconds, doubled on every attempt and jittered
+    :param classify: Function returning CONTENTION, UNAVAILABLE or
+        CALLER_ERROR for an exception; only UNAVAILABLE opens the circuit
+    :param budget: RetryBudget shared with other callers (default: module-wide)
+    :param breaker: CircuitBreaker for the backend (default: module-wide)
+    """
+    budget = default_budget if budget is None else budget
+    breaker = default_breaker if breaker is None else breaker
+
     def decorator(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            last_exception = None
+            budget.deposit()
             for attempt in range(1, retries + 1):
+                breaker.before_call()
                 try:
-                    return func(*args, **kwargs)
+                    result = func(*args, **kwargs)
                 except Exception as e:
-                    last_exception = e
-                    print(f"[Retry {attempt}/{retries}] Error: {e}. Retrying in {delay}s...")
-                    time.sleep(delay)
-            # Raise last exception if all retries fail
-            raise last_exception
+                    kind = classify(e)
+                    if kind == CALLER_ERROR:
+                        breaker.record_neutral()
+                        raise
+                    if kind == UNAVAILABLE:
+                        breaker.record_failure()
+                    else:
+                        breaker.record_neutral()
+                    if attempt == retries or breaker.state == "open" or not budget.withdraw():
+                        raise
+                    wait = backoff(attempt, delay, max_delay)
+                    print(f"[Retry {attempt}/{retries}] Error: {e}. Retrying in {wait:.2f}s...")
+                    time.sleep(wait)
+                else:
+                    breaker.record_success()
+                    return result
         return wrapper
     return decorator
 
@@ -46,6 +215,6 @@ def fetch_users_with_retry(conn):
     return cursor.fetchall()
 
 #### attempt to fetch users with automatic retry on failure
-
-users = fetch_users_with_retry()
-print(users)
\ No newline at end of file
+if __name__ == "__main__":
+    users = fetch_users_with_retry()
+    print(users)
\ No newline at end of file
@@ -1,39 +1,345 @@
 import time
-import sqlite3 
 import functools
+import sys
+import threading
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
 
+import slow_queries
+import table_events
+from db_connection import get_manager
+from sql_parse import normalize_sql, tables_read
 
-query_cache = {}
+ANY_TABLE = table_events.ANY_TABLE  # Tables of queries (or writes) that could not be parsed
+MAX_ENTRIES = 1024              # Entries kept before the least recently used is evicted
+MAX_BYTES = 64 * 1024 ** 2      # Approximate memory ceiling for cached results
+DEFAULT_TTL = 300               # Seconds an entry stays valid; None never expires
+REFRESH_WORKERS = 2             # Threads running background refresh-ahead queries
+
+
+def result_size(value):
+    """Approximate memory held by a query result (a list of row tuples)."""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        for row in value:
+            size += sys.getsizeof(row)
+            if isinstance(row, (list, tuple)):
+                size += sum(sys.getsizeof(item) for item in row)
+    return size
+
+
+def _freeze(value):
+    """Turn query parameters into something hashable for the cache key."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def make_key(query, *params, **kw_params):
+    """Cache key: the normalized SQL plus every bound parameter."""
+    return normalize_sql(query), _freeze(params), _freeze(kw_params)
+
+
+class SingleFlight:
+    """Runs one call per key at a time; concurrent callers share its outcome"""
+
+    def __init__(self):
+        self._calls = {}
+        self.shared = 0         # Callers that waited instead of running fn
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """
+        Run fn() unless a call for key is already running, in which case
+        wait for it instead.
+        :return: (result, True) for the caller that ran fn, (result, False)
+            for callers that waited; an exception from fn is raised in all
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result(), False
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, True
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class QueryCache:
+    """Thread-safe LRU cache of query results with per-entry TTL and size limits
+
+    Entries remember the tables they read; invalidate_tables() drops every
+    entry depending on a table that was written.
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        self.invalidations = self.refreshes = 0
+        self.flights = SingleFlight()
+        self._refreshing = set()
+        self._entries = OrderedDict()   # key -> (result, expires_at, size, tables)
+        self._by_table = defaultdict(set)
+        self._versions = defaultdict(int)
+        self._generation = 0            # Bumped by writes to unknown tables
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (True, result) on a hit, (False, None) on a miss or expired entry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                result, expires_at = entry[0], entry[1]
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, result
+                self._discard(key)
+                self.expirations += 1
+            self.misses += 1
+            return False, None
+
+    def expires_in(self, key):
+        """Seconds until key expires; None if it is missing or never expires"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] is None:
+                return None
+            return entry[1] - time.monotonic()
+
+    def start_refresh(self, key):
+        """Claim the background refresh of key; False if one is already queued"""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            self.refreshes += 1
+            return True
+
+    def end_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def version(self, tables):
+        """Snapshot of the write versions of tables, taken before running a query"""
+        with self._lock:
+            return self._version_locked(tables or (ANY_TABLE,))
+
+    def _version_locked(self, tables):
+        return (self._generation,) + tuple(self._versions[t] for t in sorted(tables))
+
+    def set(self, key, result, ttl=None, tables=None, version=None):
+        """Store a result, evicting least recently used entries to stay in bounds
+
+        tables are the tables the query read (unknown: any write invalidates
+        it). If version, taken with version() before the query ran, no
+        longer matches, a write committed meanwhile and nothing is stored.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        tables = frozenset(tables or (ANY_TABLE,))
+        size = result_size(result)
+        if size > self.max_bytes:
+            return
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            if version is not None and version != self._version_locked(tables):
+                return
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = (result, expires_at, size, tables)
+            for table in tables:
+                self._by_table[table].add(key)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _discard(self, key):
+        _, _, size, tables = self._entries.pop(key)
+        self.bytes -= size
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+    def invalidate_tables(self, tables):
+        """Drop every entry that read one of these tables (or unknown tables)
+
+        ANY_TABLE among the tables means the writer could not tell what it
+        changed, so every entry is dropped.
+        """
+        with self._lock:
+            if ANY_TABLE in tables:
+                self._generation += 1
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                self._by_table.clear()
+                self.bytes = 0
+                return
+            for table in set(tables) | {ANY_TABLE}:
+                self._versions[table] += 1
+                for key in list(self._by_table.get(table, ())):
+                    self._discard(key)
+                    self.invalidations += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Hit/miss/eviction counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'coalesced': self.flights.shared,
+                'refreshes': self.refreshes,
+            }
+
+
+query_cache = QueryCache()
+_refresh_pool = None
+_refresh_pool_lock = threading.Lock()
+
+
+def _refresh_executor():
+    global _refresh_pool
+    with _refresh_pool_lock:
+        if _refresh_pool is None:
+            _refresh_pool = ThreadPoolExecutor(REFRESH_WORKERS,
+                                               thread_name_prefix="cache-refresh")
+        return _refresh_pool
+
+# Drop cached reads when @transactional commits a write to their tables
+table_events.subscribe(query_cache.invalidate_tables)
 
 #### with_db_connection decorator
 def with_db_connection(func):
-    """Decorator that opens a DB connection, passes it to the function, and closes it after"""
+    """Decorator that passes this thread's long-lived DB connection to the function"""
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        conn = sqlite3.connect("users.db")
+        manager = get_manager()
+        conn = manager.acquire()
         try:
             result = func(conn, *args, **kwargs)
         finally:
-            conn.close()
+            manager.release(conn)
         return result
     return wrapper
 
 
 #### cache_query decorator
-def cache_query(func):
-    """Decorator that caches query results based on the SQL query string"""
+def cache_query(func=None, *, ttl=None, cache=None, refresh_ahead=None, disk=None):
+    """Decorator that caches query results keyed by the normalized SQL and its parameters
+
+    Use as @cache_query, or @cache_query(ttl=60, cache=QueryCache(...)).
+    Concurrent misses for the same key run the query once; the other
+    callers wait for that result. With refresh_ahead=N, a hit on an entry
+    expiring within N seconds re-runs the query in the background, on a
+    connection from db_connection, so hot entries are replaced before
+    they expire. Misses are timed and passed to slow_queries when it is
+    enabled.
+
+    disk=DiskCache(...) adds a second tier shared between processes and
+    restarts: memory misses look there before running the query, and
+    query results are written to both tiers.
+    """
+    if func is None:
+        return lambda f: cache_query(f, ttl=ttl, cache=cache, refresh_ahead=refresh_ahead,
+                                     disk=disk)
+    store = query_cache if cache is None else cache
+
+    def load(conn, key, query, args, kwargs, reason="MISS"):
+        tables = tables_read(query)
+        version = store.version(tables)
+        if disk is not None:
+            if reason == "MISS":
+                found, result = disk.get(key)
+                if found:
+                    print(f"[CACHE DISK HIT] Returning cached result for query: {query}")
+                    store.set(key, result, ttl, tables, version)
+                    return result
+            stamp = disk.stamp()
+        print(f"[CACHE {reason}] Executing query: {query}")
+        start = time.perf_counter()
+        result = func(conn, *args, **kwargs)
+        slow_queries.check(query, time.perf_counter() - start, conn)
+        store.set(key, result, ttl, tables, version)
+        if disk is not None:
+            disk.set(key, result, store.ttl if ttl is None else ttl, stamp)
+        return result
+
+    def refresh(key, query, args, kwargs):
+        manager = get_manager()
+        conn = manager.acquire()
+        try:
+            store.flights.do(key, lambda: load(conn, key, query, args, kwargs, "REFRESH"))
+        except Exception as e:
+            print(f"[CACHE REFRESH] Failed to refresh query: {query}: {e}")
+        finally:
+            manager.release(conn)
+            store.end_refresh(key)
+
     @functools.wraps(func)
     def wrapper(conn, *args, **kwargs):
         # Try to extract the query (can be positional or keyword)
-        query = kwargs.get("query") if "query" in kwargs else (args[0] if args else None)
+        if "query" in kwargs:
+            query = kwargs["query"]
+            params = {k: v for k, v in kwargs.items() if k != "query"}
+            key = make_key(query, *args, **params)
+        else:
+            query = args[0] if args else None
+            key = make_key(query, *args[1:], **kwargs) if query else None
 
-        if query in query_cache:
+        if key is None:
+            return func(conn, *args, **kwargs)
+
+        found, result = store.get(key)
+        if found:
             print(f"[CACHE HIT] Returning cached result for query: {query}")
-            return query_cache[query]
+            if refresh_ahead is not None:
+                remaining = store.expires_in(key)
+                if remaining is not None and remaining <= refresh_ahead and store.start_refresh(key):
+                    _refresh_executor().submit(refresh, key, query, args, kwargs)
+            return result
 
-        print(f"[CACHE MISS] Executing query: {query}")
-        result = func(conn, *args, **kwargs)
-        query_cache[query] = result
+        result, _ = store.flights.do(key, lambda: load(conn, key, query, args, kwargs))
         return result
     return wrapper
 
@@ -44,8 +350,10 @@ def fetch_users_with_cache(conn, query):
     cursor.execute(query)
     return cursor.fetchall()
 
-#### First call will cache the result
-users = fetch_users_with_cache(query="SELECT * FROM users")
+if __name__ == "__main__":
+    #### First call will cache the result
+    users = fetch_users_with_cache(query="SELECT * FROM users")
 
-#### Second call will use the cached result
-users_again = fetch_users_with_cache(query="SELECT * FROM users")
\ No newline at end of file
+    #### Second call will use the cached result
+    users_again = fetch_users_with_cache(query="SELECT * FROM users")
+    print(query_cache.stats())
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Compare sustained write throughput of @with_db_connection @transactional
+(one transaction per call) against @group_commit (many calls per
+transaction) on users.db, with the default PRAGMAs and again with
+synchronous=FULL, where every commit waits for an fsync.
+
+Run from a directory containing users.db:
+
+    python3 bench_group_commit.py [threads] [writes_per_thread]
+"""
+import sys
+import threading
+import time
+
+import db_connection
+transactional_module = __import__('2-transactional')
+from group_commit import group_commit, get_writer
+
+SETTINGS = [
+    ("synchronous=NORMAL", db_connection.PRAGMAS),
+    ("synchronous=FULL", {**db_connection.PRAGMAS, "synchronous": "FULL"}),
+]
+
+
+@group_commit
+def update_user_email_batched(conn, user_id, new_email):
+    cursor = conn.cursor()
+    cursor.execute("UPDATE users SET email = ? WHERE id = ?", (new_email, user_id))
+
+
+def run(update, threads, writes):
+    """:return: Writes per second with `threads` threads each calling update `writes` times"""
+    def worker(n):
+        for i in range(writes):
+            user_id = (n * writes + i) % 100 + 1
+            update(user_id=user_id, new_email=f"user{user_id}@example.com")
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return threads * writes / (time.perf_counter() - start)
+
+
+def main(threads=8, writes=500):
+    print(f"threads={threads} writes_per_thread={writes}")
+    writer = get_writer()
+    for label, pragmas in SETTINGS:
+        # The writer keeps its connection; stop it so it reopens with these PRAGMAs
+        writer.stop()
+        db_connection.configure(pragmas=pragmas)
+        print(label)
+        per_call = run(transactional_module.update_user_email, threads, writes)
+        print(f"{'per-call transaction':>22} {per_call:>10.0f} writes/s")
+        calls, batches = writer.calls, writer.batches
+        batched = run(update_user_email_batched, threads, writes)
+        calls, batches = writer.calls - calls, writer.batches - batches
+        print(f"{'group commit':>22} {batched:>10.0f} writes/s "
+              f"({calls / max(1, batches):.1f} calls/transaction)")
+    writer.stop()
+    db_connection.configure()
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    main(*args)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Compare per-call latency of with_db_connection against opening and
+closing a fresh connection on every call (the previous behaviour).
+
+Run from a directory containing users.db:
+
+    python3 bench_with_db_connection.py [calls]
+"""
+import sqlite3
+import statistics
+import sys
+import time
+
+with_db_connection_module = __import__('1-with_db_connection')
+from db_connection import get_manager
+
+
+def get_user_per_call_connect(user_id):
+    """The old decorator body, inlined: connect, query, close."""
+    conn = sqlite3.connect("users.db")
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
+        return cursor.fetchone()
+    finally:
+        conn.close()
+
+
+def time_calls(func, calls):
+    """:return: list of per-call latencies in microseconds"""
+    timings = []
+    for i in range(calls):
+        start = time.perf_counter()
+        func(user_id=i % 100 + 1)
+        timings.append((time.perf_counter() - start) * 1e6)
+    return timings
+
+
+def main(calls=10000):
+    # Open and tune the connection outside the timed loop
+    manager = get_manager()
+    manager.release(manager.acquire())
+    cases = (
+        ('connect per call', get_user_per_call_connect),
+        ('persistent', with_db_connection_module.get_user_by_id),
+    )
+    print(f"calls={calls}")
+    print(f"{'mode':>18} {'mean (us)':>10} {'p50 (us)':>10} {'p99 (us)':>10}")
+    for label, func in cases:
+        timings = sorted(time_calls(func, calls))
+        print(f"{label:>18} {statistics.fmean(timings):>10.1f} "
+              f"{timings[len(timings) // 2]:>10.1f} "
+              f"{timings[int(len(timings) * 0.99)]:>10.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,158 @@
+import functools
+import sqlite3
+import threading
+import weakref
+
+DB_PATH = "users.db"
+
+# Applied to every connection when it is opened
+PRAGMAS = {
+    "journal_mode": "WAL",          # Readers do not block the writer
+    "synchronous": "NORMAL",        # fsync at checkpoints, not every commit (safe with WAL)
+    "cache_size": -64000,           # Page cache size in KiB when negative (~64 MB)
+    "mmap_size": 256 * 1024 ** 2,   # Read the database through a memory map
+    "temp_store": "MEMORY",         # Temporary tables and indices in RAM
+}
+CACHED_STATEMENTS = 256             # Prepared statements kept per connection
+
+
+class _ThreadConnection:
+    """A thread's connection and call depth; closes the connection when the
+    thread ends and its thread-local storage is released"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.depth = 0
+        self.tracers = []
+        # Closes over the list only, so the connection does not keep its holder alive
+        self._dispatch = functools.partial(_dispatch, self.tracers)
+
+    def add_tracer(self, callback):
+        if not self.tracers:
+            self.conn.set_trace_callback(self._dispatch)
+        self.tracers.append(callback)
+
+    def remove_tracer(self, callback):
+        if callback in self.tracers:
+            self.tracers.remove(callback)
+        if not self.tracers:
+            self.conn.set_trace_callback(None)
+
+    def close(self):
+        self.conn.close()
+
+    __del__ = close
+
+
+def _dispatch(tracers, statement):
+    for callback in list(tracers):
+        callback(statement)
+
+
+class ConnectionManager:
+    """Keeps one long-lived SQLite connection per thread
+
+    Reusing the connection keeps SQLite's page cache and prepared-statement
+    cache warm between calls instead of rebuilding them on every connect.
+    The manager only holds weak references, so a thread's connection is
+    closed as soon as the thread exits.
+    """
+
+    def __init__(self, path=DB_PATH, pragmas=None):
+        self.path = path
+        self.pragmas = dict(PRAGMAS if pragmas is None else pragmas)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = weakref.WeakSet()   # _ThreadConnection of live threads
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, cached_statements=CACHED_STATEMENTS,
+                               check_same_thread=False)
+        try:
+            for name, value in self.pragmas.items():
+                conn.execute(f"PRAGMA {name} = {value}")
+        except sqlite3.Error:
+            conn.close()
+            raise
+        holder = _ThreadConnection(conn)
+        with self._lock:
+            self._connections.add(holder)
+        return holder
+
+    def acquire(self):
+        """Return this thread's connection, opening it on first use"""
+        holder = getattr(self._local, "holder", None)
+        if holder is None:
+            holder = self._local.holder = self._open()
+        holder.depth += 1
+        return holder.conn
+
+    def release(self, conn):
+        """Hand the connection back; work left uncommitted by the outermost caller is rolled back"""
+        holder = self._local.holder
+        holder.depth -= 1
+        if holder.depth == 0 and conn.in_transaction:
+            conn.rollback()
+
+    def holder_for(self, conn):
+        """The _ThreadConnection wrapping conn, or None if this manager did not open it"""
+        holder = getattr(self._local, "holder", None)
+        if holder is not None and holder.conn is conn:
+            return holder
+        with self._lock:
+            for holder in self._connections:
+                if holder.conn is conn:
+                    return holder
+        return None
+
+    def __len__(self):
+        """Number of open connections, one per live thread that used the manager"""
+        with self._lock:
+            return len(self._connections)
+
+    def close_all(self):
+        """Close every connection opened by this manager"""
+        with self._lock:
+            holders = list(self._connections)
+            self._connections = weakref.WeakSet()
+        for holder in holders:
+            holder.close()
+        self._local = threading.local()
+
+
+connections = ConnectionManager()
+
+
+def configure(path=DB_PATH, pragmas=None):
+    """Replace the shared manager, e.g. to point at another file or change PRAGMAs"""
+    global connections
+    connections.close_all()
+    connections = ConnectionManager(path, pragmas)
+    return connections
+
+
+def get_manager():
+    return connections
+
+
+def add_trace_callback(conn, callback):
+    """Call callback(statement) for every statement run on conn
+
+    sqlite3 keeps a single trace callback per connection. On connections
+    opened by the manager, callbacks added here run side by side; use this
+    instead of conn.set_trace_callback, which would replace all of them.
+    Other connections get callback installed directly.
+    """
+    holder = connections.holder_for(conn)
+    if holder is None:
+        conn.set_trace_callback(callback)
+    else:
+        holder.add_tracer(callback)
+
+
+def remove_trace_callback(conn, callback):
+    holder = connections.holder_for(conn)
+    if holder is None:
+        conn.set_trace_callback(None)
+    else:
+        holder.remove_tracer(callback)
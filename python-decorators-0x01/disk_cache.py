@@ -0,0 +1,156 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+
+from db_connection import DB_PATH, get_manager
+
+CACHE_PATH = "query_cache.db"
+MAX_ENTRIES = 100000        # Rows kept in the cache file before the oldest are pruned
+PRUNE_EVERY = 500           # Writes between prunes
+COMPRESS_OVER = 1024        # Pickled results larger than this many bytes are zlib-compressed
+BUSY_TIMEOUT = 5.0          # Seconds to wait for another process holding the write lock
+
+
+def source_stamp(path=DB_PATH):
+    """
+    Bytes that change whenever any process commits to the SQLite database
+    at path. The file change counter in the database header only moves
+    outside WAL mode, so the stamp also holds the file's size and mtime
+    (changed by every checkpoint) and, while the WAL is in use, the
+    transaction counter, frame count and salts from the WAL index.
+    """
+    with open(path, "rb") as file:
+        stamp = file.read(28)[24:28]
+        info = os.fstat(file.fileno())
+    stamp += struct.pack("<qq", info.st_mtime_ns, info.st_size)
+    try:
+        with open(path + "-shm", "rb") as file:
+            index = file.read(48)
+        stamp += index[8:12] + index[16:20] + index[32:40]
+    except FileNotFoundError:
+        pass
+    return stamp
+
+
+def disk_key(key, source):
+    """Fixed-size key for a cache_query key tuple (normalized SQL and
+    parameters) run against the database file at source"""
+    return hashlib.blake2b(repr((os.path.abspath(source), key)).encode(),
+                           digest_size=16).digest()
+
+
+def dumps(value):
+    """:return: (blob, compressed)"""
+    blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    if len(blob) > COMPRESS_OVER:
+        return zlib.compress(blob, 1), True
+    return blob, False
+
+
+def loads(blob, compressed):
+    return pickle.loads(zlib.decompress(blob) if compressed else blob)
+
+
+class DiskCache:
+    """Query results in a SQLite file shared by every process on the machine
+
+    Each entry carries the source_stamp() of the source database taken
+    before the query ran; a lookup whose stamp no longer matches is a
+    miss, so any committed write to the source database, from any
+    process, retires every entry. The cache file runs in WAL mode so
+    readers never block on a writer. Only use a cache file writable by
+    trusted processes: entries are pickled.
+    """
+
+    def __init__(self, path=CACHE_PATH, source=None, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.source = source
+        self.max_entries = max_entries
+        self.hits = self.misses = self.stale = 0
+        self._writes = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key BLOB PRIMARY KEY, value BLOB NOT NULL, compressed INTEGER NOT NULL,"
+            " stamp BLOB NOT NULL, expires_at REAL, stored_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_stored_at ON entries(stored_at)")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def source_path(self):
+        """The source database: `source` if given, else the file
+        with_db_connection currently uses (see db_connection.configure)"""
+        return self.source if self.source is not None else get_manager().path
+
+    def stamp(self):
+        """Current stamp of the source database; take it before running the query"""
+        return source_stamp(self.source_path())
+
+    def get(self, key):
+        """Return (True, result) for a fresh entry, (False, None) otherwise"""
+        row = self._connection().execute(
+            "SELECT value, compressed, stamp, expires_at FROM entries WHERE key = ?",
+            (disk_key(key, self.source_path()),)
+        ).fetchone()
+        found = (row is not None and (row[3] is None or row[3] > time.time())
+                 and row[2] == self.stamp())
+        with self._lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self.stale += row is not None
+        if not found:
+            return False, None
+        return True, loads(row[0], row[1])
+
+    def set(self, key, result, ttl=None, stamp=None):
+        """Store a result computed while the source database had this stamp"""
+        blob, compressed = dumps(result)
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+            (disk_key(key, self.source_path()), blob, compressed, self.stamp() if stamp is None else stamp,
+             None if ttl is None else now + ttl, now)
+        )
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def prune(self):
+        """Delete expired entries and the oldest ones beyond max_entries"""
+        conn = self._connection()
+        conn.execute("DELETE FROM entries WHERE expires_at < ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM entries WHERE key IN (SELECT key FROM entries "
+            "ORDER BY stored_at DESC LIMIT -1 OFFSET ?)", (self.max_entries,)
+        )
+
+    def clear(self):
+        self._connection().execute("DELETE FROM entries")
+
+    def stats(self):
+        count, size = self._connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM entries").fetchone()
+        with self._lock:
+            return {'entries': count, 'bytes': size, 'hits': self.hits,
+                    'misses': self.misses, 'stale': self.stale,
+                    'file_bytes': os.path.getsize(self.path)}
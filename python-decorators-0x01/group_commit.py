@@ -0,0 +1,208 @@
+import atexit
+import functools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from db_connection import get_manager
+from table_events import WriteTracker, publish
+
+MAX_BATCH = 256         # Calls applied per transaction at most
+MAX_DELAY = 0.0         # Extra seconds the writer lingers for more calls after the first
+
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """Background writer that applies queued write calls in shared transactions
+
+    While one batch commits, new calls queue up; the writer then takes
+    everything waiting, up to MAX_BATCH, lingering at most MAX_DELAY
+    seconds for more, and runs the calls one after another inside a single
+    BEGIN IMMEDIATE ... COMMIT on the writer thread's connection. Each call
+    runs under its own SAVEPOINT, so a call that raises is rolled back on
+    its own and only its caller sees the error. Functions must not commit
+    or roll back themselves.
+    """
+
+    def __init__(self, max_batch=MAX_BATCH, max_delay=MAX_DELAY):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = self.calls = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self._start_locked()
+
+    def stop(self):
+        """Apply everything already queued, then stop the writer thread"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._queue.put(_STOP)
+        if thread is not None:
+            thread.join()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queue func(conn, *args, **kwargs) for the next batch.
+        :return: Future resolved with the call's result or exception after commit
+        """
+        future = Future()
+        if threading.current_thread() is self._thread:
+            # Called from inside a batched function: already in the transaction
+            try:
+                future.set_result(func(self._conn, *args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        with self._lock:
+            # Queued under the lock so a dying writer cannot miss this call
+            self._start_locked()
+            self._queue.put((func, args, kwargs, future))
+        return future
+
+    def _start_locked(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="group-commit",
+                                            daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        manager = get_manager()
+        try:
+            self._conn = manager.acquire()
+        except Exception as e:
+            # No connection (e.g. database locked while setting PRAGMAs):
+            # fail what is queued and let the next call start a new writer
+            self._shutdown(e)
+            return
+        try:
+            stopping = False
+            while not stopping:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                batch = [item]
+                deadline = time.monotonic() + self.max_delay
+                while len(batch) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    try:
+                        if remaining > 0:
+                            item = self._queue.get(timeout=remaining)
+                        else:
+                            item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                try:
+                    self._apply(batch)
+                except Exception as e:
+                    _fail(batch, e)
+        except Exception as e:
+            self._shutdown(e)
+        finally:
+            manager.release(self._conn)
+
+    def _shutdown(self, error):
+        """Forget this writer thread and fail every call still queued for it"""
+        with self._lock:
+            if self._thread is threading.current_thread():
+                self._thread = None
+            batch = []
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _STOP:
+                    batch.append(item)
+        _fail(batch, error)
+
+    def _apply(self, batch):
+        conn = self._conn
+        started, outcomes = set(), []
+        try:
+            with WriteTracker(conn) as writes:
+                conn.execute("BEGIN IMMEDIATE")
+                for func, args, kwargs, future in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    started.add(future)
+                    conn.execute("SAVEPOINT group_commit_call")
+                    try:
+                        result = func(conn, *args, **kwargs)
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO group_commit_call")
+                        conn.execute("RELEASE group_commit_call")
+                        outcomes.append((future, None, e))
+                    else:
+                        conn.execute("RELEASE group_commit_call")
+                        outcomes.append((future, result, None))
+                conn.commit()
+        except Exception as e:
+            # BEGIN or COMMIT failed: nothing in this batch was written
+            if conn.in_transaction:
+                conn.rollback()
+            _fail(batch, e, started)
+            return
+        self.batches += 1
+        self.calls += len(outcomes)
+        publish(writes.changed())
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+def _fail(batch, error, started=()):
+    """Resolve every unresolved future of a batch with error"""
+    for _, _, _, future in batch:
+        if future.done():
+            continue
+        if future in started or future.set_running_or_notify_cancel():
+            future.set_exception(error)
+
+
+_writer = GroupCommitWriter()
+atexit.register(lambda: _writer.stop())
+
+
+def get_writer():
+    return _writer
+
+
+def group_commit(func=None, *, writer=None):
+    """Decorator that runs func(conn, ...) through the group-commit writer
+
+    Use in place of @with_db_connection @transactional. Calling the function
+    blocks until its batch has committed and returns its own result or
+    raises its own error; func.submit(...) returns the Future instead, for
+    callers issuing many writes without waiting on each.
+
+    Group commit pays off only when the commit itself is the expensive
+    part, i.e. when each COMMIT waits for an fsync: synchronous=FULL, or
+    a rollback journal instead of WAL, on storage where fsync takes
+    milliseconds. Under the default PRAGMAS (WAL with synchronous=NORMAL)
+    commits do not fsync, and handing each call to the writer thread costs
+    more than the shared commit saves; bench_group_commit.py measures both.
+    """
+    if func is None:
+        return lambda f: group_commit(f, writer=writer)
+
+    def submit(*args, **kwargs):
+        return (writer or _writer).submit(func, *args, **kwargs)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return submit(*args, **kwargs).result()
+    wrapper.submit = submit
+    return wrapper
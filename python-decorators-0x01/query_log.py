@@ -0,0 +1,183 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import threading
+from bisect import bisect_left
+
+logger = logging.getLogger("query_log")
+logger.propagate = False
+
+SAMPLE_RATE = 1.0       # Fraction of successful queries written to the log
+QUEUE_SIZE = 10000      # Records buffered for the listener thread before dropping
+# Upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_sample_rate = SAMPLE_RATE
+_listener = None
+_dropped = 0
+_histograms = {}                # fingerprint -> LatencyHistogram
+_lock = threading.Lock()
+_config_lock = threading.RLock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line built from the record's `query` attribute"""
+
+    def format(self, record):
+        fields = {"time": self.formatTime(record), "level": record.levelname}
+        fields.update(getattr(record, "query", {}))
+        return json.dumps(fields)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that counts records instead of blocking when the queue is full"""
+
+    def prepare(self, record):
+        # Fields are already plain data; skip the default message formatting
+        return record
+
+    def enqueue(self, record):
+        global _dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with _lock:
+                _dropped += 1
+
+
+class LatencyHistogram:
+    """Counts of query durations per bucket, plus count/total/max"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, duration_ms, rows, error):
+        self.counts[bisect_left(BUCKETS_MS, duration_ms)] += 1
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        if error:
+            self.errors += 1
+        if rows:
+            self.rows += rows
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (max for the last)"""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if count and seen >= rank:
+                return bound
+        return self.max_ms
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "rows": self.rows,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.quantile(0.5),
+            "p99_ms": self.quantile(0.99),
+            "max_ms": self.max_ms,
+            "buckets": {f"<={bound}": count for bound, count
+                        in zip(BUCKETS_MS + ("inf",), self.counts) if count},
+        }
+
+
+def configure(sample_rate=SAMPLE_RATE, handlers=None, queue_size=QUEUE_SIZE):
+    """
+    (Re)start the background listener.
+    :param sample_rate: Fraction of successful queries logged; failures are always logged
+    :param handlers: Handlers the listener thread writes to (default: stderr, JSON lines)
+    :param queue_size: Records buffered before new ones are dropped
+    """
+    global _sample_rate, _listener
+    if handlers is None:
+        handler = logging.StreamHandler()
+        handler.setFormatter(JsonFormatter())
+        handlers = [handler]
+    with _config_lock:
+        stop()
+        records = queue.Queue(queue_size)
+        listener = logging.handlers.QueueListener(records, *handlers,
+                                                  respect_handler_level=True)
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.addHandler(_DroppingQueueHandler(records))
+        logger.setLevel(logging.INFO)
+        listener.start()
+        with _lock:
+            _sample_rate = sample_rate
+            _listener = listener
+
+
+def stop():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    with _lock:
+        listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+atexit.register(stop)
+
+
+def record(fingerprint, duration, rows=None, error=None):
+    """
+    Account for one executed query: always update its histogram, and
+    hand a structured record to the listener thread if it is sampled.
+    :param duration: Seconds the query took
+    """
+    duration_ms = duration * 1000
+    with _lock:
+        histogram = _histograms.get(fingerprint)
+        if histogram is None:
+            histogram = _histograms[fingerprint] = LatencyHistogram()
+        histogram.add(duration_ms, rows, error)
+        sample_rate = _sample_rate
+    if error is None and sample_rate < 1.0 and random.random() >= sample_rate:
+        return
+    if _listener is None:
+        with _config_lock:
+            if _listener is None:
+                configure(sample_rate)
+    fields = {"fingerprint": fingerprint, "duration_ms": round(duration_ms, 3),
+              "rows": rows, "error": None if error is None else repr(error)}
+    logger.log(logging.ERROR if error is not None else logging.INFO,
+               "query", extra={"query": fields})
+
+
+def histograms():
+    """:return: {fingerprint: histogram snapshot}, slowest total time first"""
+    with _lock:
+        items = [(fp, h.snapshot()) for fp, h in _histograms.items()]
+    items.sort(key=lambda item: item[1]["mean_ms"] * item[1]["count"], reverse=True)
+    return dict(items)
+
+
+def dump_histograms(file=None):
+    """Print one line per fingerprint with count, mean, p50, p99 and max latency"""
+    for fp, h in histograms().items():
+        print(f"{h['count']:>8} calls  mean={h['mean_ms']:.3f}ms  p50<={h['p50_ms']}ms  "
+              f"p99<={h['p99_ms']}ms  max={h['max_ms']:.3f}ms  errors={h['errors']}  {fp}",
+              file=file)
+    if _dropped:
+        print(f"{_dropped} log records dropped (queue full)", file=file)
+
+
+def reset():
+    """Forget all histograms"""
+    global _dropped
+    with _lock:
+        _histograms.clear()
+        _dropped = 0
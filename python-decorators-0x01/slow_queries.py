@@ -0,0 +1,151 @@
+import re
+import sqlite3
+import threading
+
+from db_connection import get_manager
+from sql_parse import fingerprint as query_fingerprint
+
+THRESHOLD = 0.1         # Seconds; slower queries are recorded and explained
+REPORT_LIMIT = 10
+
+# Plan details worth flagging, mapped to the label shown in the report
+# (SCAN CONSTANT ROW and scans of subqueries are not table scans)
+FLAGS = (
+    (re.compile(r"^SCAN (?!CONSTANT ROW$|\()(?!.*\bUSING\b)"), "full table scan"),
+    (re.compile(r"USE TEMP B-TREE"), "temp b-tree"),
+)
+# Plan lines naming a CTE or subquery; later SCANs of that name read its result
+_SUBQUERY = re.compile(r"^(?:CO-ROUTINE|MATERIALIZE) (\S+)")
+
+_enabled = False
+_threshold = THRESHOLD
+_stats = {}             # fingerprint -> SlowQuery
+_lock = threading.Lock()
+
+
+class SlowQuery:
+    """Slow calls of one query fingerprint and its plan, explained once"""
+
+    def __init__(self, fingerprint, query):
+        self.fingerprint = fingerprint
+        self.query = query
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.plan = None        # list of plan detail lines once explained
+        self.flags = ()
+
+    def snapshot(self):
+        return {
+            'fingerprint': self.fingerprint,
+            'count': self.count,
+            'total_seconds': self.total_seconds,
+            'max_seconds': self.max_seconds,
+            'plan': self.plan,
+            'flags': self.flags,
+        }
+
+
+def enable(threshold=THRESHOLD):
+    """Start recording and explaining queries slower than threshold seconds"""
+    global _enabled, _threshold
+    _enabled = True
+    _threshold = threshold
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    """Forget recorded slow queries and cached plans"""
+    with _lock:
+        _stats.clear()
+
+
+def explain(conn, query, params=()):
+    """
+    :return: EXPLAIN QUERY PLAN detail lines for query, indented by depth
+    Unbound placeholders are bound to NULL; the plan does not depend on values.
+    """
+    statement = "EXPLAIN QUERY PLAN " + query.strip().rstrip(";")
+    try:
+        rows = conn.execute(statement, params).fetchall()
+    except sqlite3.ProgrammingError as e:
+        match = re.search(r"uses (\d+)", str(e))
+        if params or not match:
+            raise
+        rows = conn.execute(statement, [None] * int(match.group(1))).fetchall()
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+
+def plan_flags(plan):
+    """Labels from FLAGS matching any line of a plan"""
+    lines = [line.strip() for line in plan]
+    subqueries = {m.group(1) for m in map(_SUBQUERY.match, lines) if m}
+    lines = [line for line in lines
+             if not (line.startswith("SCAN ") and line.split()[1] in subqueries)]
+    return tuple(label for pattern, label in FLAGS
+                 if any(pattern.search(line) for line in lines))
+
+
+def check(query, duration, conn=None, params=(), fingerprint=None):
+    """
+    Record a query that took duration seconds if it crossed the threshold.
+    The first slow call of each fingerprint runs EXPLAIN QUERY PLAN on conn
+    (or this thread's connection from db_connection) and caches the plan.
+    """
+    if not _enabled or duration < _threshold:
+        return
+    if fingerprint is None:
+        fingerprint = query_fingerprint(query)
+    with _lock:
+        entry = _stats.get(fingerprint)
+        needs_plan = entry is None
+        if needs_plan:
+            entry = _stats[fingerprint] = SlowQuery(fingerprint, query)
+        entry.count += 1
+        entry.total_seconds += duration
+        entry.max_seconds = max(entry.max_seconds, duration)
+    if not needs_plan:
+        return
+
+    manager = None
+    if conn is None:
+        manager = get_manager()
+        conn = manager.acquire()
+    try:
+        plan = explain(conn, query, params)
+    except sqlite3.Error as e:
+        plan = [f"(could not explain: {e})"]
+    finally:
+        if manager is not None:
+            manager.release(conn)
+    with _lock:
+        entry.plan = plan
+        entry.flags = plan_flags(plan)
+
+
+def worst(limit=REPORT_LIMIT):
+    """:return: Snapshots of the slow fingerprints with the most total slow time"""
+    with _lock:
+        entries = [entry.snapshot() for entry in _stats.values()]
+    entries.sort(key=lambda entry: entry['total_seconds'], reverse=True)
+    return entries[:limit]
+
+
+def report(limit=REPORT_LIMIT, file=None):
+    """Print the worst offenders with their flags and plans"""
+    for entry in worst(limit):
+        flags = f"  [{', '.join(entry['flags'])}]" if entry['flags'] else ""
+        print(f"{entry['count']} slow calls, total={entry['total_seconds']:.3f}s "
+              f"max={entry['max_seconds']:.3f}s{flags}\n  {entry['fingerprint']}",
+              file=file)
+        for line in entry['plan'] or ["(plan pending)"]:
+            print(f"    {line}", file=file)
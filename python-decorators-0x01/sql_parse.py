@@ -0,0 +1,108 @@
+import re
+
+# Quoted strings and identifiers are copied verbatim; everything else is
+# whitespace-collapsed and upper-cased (SQLite keywords and identifiers
+# are case-insensitive)
+_TOKENS = re.compile(r"""
+    '(?:[^']|'')*'          # string literal
+  | "(?:[^"]|"")*"          # quoted identifier
+  | `[^`]*`                 # MySQL-style identifier
+  | \[[^\]]*\]              # SQL Server-style identifier
+  | [^'"`\[]+               # anything else
+""", re.VERBOSE)
+
+
+def normalize_sql(query):
+    """
+    Canonical text of a query so that formatting differences do not
+    produce different cache keys: whitespace collapsed, keywords
+    upper-cased, trailing semicolons removed. Literals are kept.
+    """
+    parts = []
+    for token in _TOKENS.findall(query):
+        if token[0] in "'\"`[":
+            parts.append(token)
+        else:
+            parts.append(re.sub(r"\s+", " ", token).upper())
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+_NAME = r'(?:"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\]|[\w.]+)'
+
+_WRITE_PATTERNS = [
+    re.compile(r"^\s*(?:INSERT|REPLACE)(?:\s+OR\s+\w+)?\s+INTO\s+(" + _NAME + ")", re.I),
+    re.compile(r"^\s*UPDATE(?:\s+OR\s+\w+)?\s+(" + _NAME + ")", re.I),
+    re.compile(r"^\s*DELETE\s+FROM\s+(" + _NAME + ")", re.I),
+    re.compile(r"^\s*(?:DROP|ALTER)\s+TABLE(?:\s+IF\s+EXISTS)?\s+(" + _NAME + ")", re.I),
+]
+_CLAUSE_END = (r"(?=\b(?:WHERE|GROUP|ORDER|LIMIT|HAVING|UNION|EXCEPT|INTERSECT|JOIN|INNER"
+               r"|LEFT|RIGHT|CROSS|NATURAL|FULL|ON|USING|WINDOW)\b|\)|;|$)")
+_FROM = re.compile(r"\bFROM\s+(.*?)" + _CLAUSE_END, re.I | re.S)
+_JOIN = re.compile(r"\bJOIN\s+(" + _NAME + ")", re.I)
+
+
+def _table_name(name):
+    """Bare, lower-cased table name without quotes or schema prefix."""
+    name = name.strip()
+    if name[0] in '"`[':
+        name = name[1:-1]
+    return name.split(".")[-1].lower()
+
+
+def tables_written(query):
+    """Set of tables modified by an INSERT/REPLACE/UPDATE/DELETE/DROP/ALTER."""
+    for pattern in _WRITE_PATTERNS:
+        match = pattern.match(query)
+        if match:
+            return {_table_name(match.group(1))}
+    return set()
+
+
+_READ_ONLY = re.compile(
+    r"^\s*(?:SELECT|VALUES|BEGIN|COMMIT|END|ROLLBACK|SAVEPOINT|RELEASE|EXPLAIN"
+    r"|PRAGMA|CREATE|ANALYZE|VACUUM)\b", re.I)
+_WRITE_KEYWORD = re.compile(r"\b(?:INSERT|UPDATE|DELETE|REPLACE)\b")
+
+
+def is_read_only(query):
+    """True for statements that cannot change rows of existing tables."""
+    if _READ_ONLY.match(query):
+        return True
+    if re.match(r"^\s*WITH\b", query, re.I):
+        # A CTE followed by SELECT only reads; literals are stripped first
+        return not _WRITE_KEYWORD.search(fingerprint(query))
+    return False
+
+
+def tables_read(query):
+    """Set of tables named after FROM or JOIN in a query (empty if unknown)."""
+    tables = set()
+    for match in _FROM.finditer(query):
+        for item in match.group(1).split(","):
+            item = item.strip()
+            if item and not item.startswith("("):
+                tables.add(_table_name(re.match(_NAME, item).group(0)))
+    for match in _JOIN.finditer(query):
+        tables.add(_table_name(match.group(1)))
+    return tables
+
+
+_LITERALS = re.compile(r"""
+    '(?:[^']|'')*'                              # string literal
+  | "(?:[^"]|"")*" | `[^`]*` | \[[^\]]*\]        # quoted identifiers, kept
+  | \b[Xx]'[0-9A-Fa-f]*'                        # blob literal
+  | (?<![\w.])-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?  # number
+""", re.VERBOSE)
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.I)
+
+
+def fingerprint(query):
+    """
+    Shape of a query with every literal replaced by ?, so that calls that
+    differ only in their values group together: `WHERE id = 7` and
+    `where  id = 12` both become `WHERE ID = ?`. IN lists collapse to IN (?).
+    """
+    def replace(match):
+        token = match.group(0)
+        return token if token[0] in '"`[' else "?"
+    return _IN_LIST.sub("IN (?)", _LITERALS.sub(replace, normalize_sql(query)))
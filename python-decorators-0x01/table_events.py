@@ -0,0 +1,83 @@
+import threading
+
+from db_connection import add_trace_callback, remove_trace_callback
+from sql_parse import is_read_only, tables_written
+
+# Published when rows changed in tables that could not be identified
+ANY_TABLE = "*"
+
+_listeners = []
+_lock = threading.Lock()
+
+
+def subscribe(callback):
+    """Call callback(tables) after every committed write; tables is a frozenset"""
+    with _lock:
+        _listeners.append(callback)
+
+
+def unsubscribe(callback):
+    with _lock:
+        if callback in _listeners:
+            _listeners.remove(callback)
+
+
+def publish(tables):
+    """Tell every subscriber that these tables changed"""
+    if not tables:
+        return
+    with _lock:
+        listeners = list(_listeners)
+    for callback in listeners:
+        callback(frozenset(tables))
+
+
+class WriteTracker:
+    """Collect the tables written on a connection using sqlite's trace callback
+
+    The callback is added through db_connection.add_trace_callback, so
+    trace callbacks the application registered the same way keep running.
+
+    Rows changed by writes whose table cannot be parsed (e.g. WITH ...
+    INSERT), by writes to tables that have triggers, or while foreign keys
+    are enforced (cascades are not traced) are reported as ANY_TABLE.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.tables = set()
+        self.unknown = conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+        self.changes_before = conn.total_changes
+
+    def __enter__(self):
+        add_trace_callback(self.conn, self._trace)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        remove_trace_callback(self.conn, self._trace)
+        return False
+
+    def _trace(self, statement):
+        tables = tables_written(statement)
+        if tables:
+            self.tables.update(tables)
+        elif not is_read_only(statement):
+            self.unknown = True
+
+    def changed(self):
+        """Tables written, or an empty set if no row actually changed"""
+        if self.conn.total_changes == self.changes_before:
+            return set()
+        if self.unknown or self._has_triggers():
+            return self.tables | {ANY_TABLE}
+        return self.tables
+
+    def _has_triggers(self):
+        if not self.tables:
+            return False
+        tables = sorted(self.tables)
+        placeholders = ", ".join("?" * len(tables))
+        return self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'trigger' "
+            f"AND lower(tbl_name) IN ({placeholders}) LIMIT 1", tables
+        ).fetchone() is not None
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import db_connection
+from group_commit import GroupCommitWriter
+
+PRAGMAS = {"journal_mode": "WAL", "busy_timeout": 100}
+
+
+def insert_user(conn, user_id):
+    conn.execute("INSERT INTO users (id) VALUES (?)", (user_id,))
+    return user_id
+
+
+class GroupCommitBusyTest(unittest.TestCase):
+    """Calls must be resolved, never left hanging, when the database is locked"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "users.db")
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY)")
+        conn.close()
+        db_connection.configure(self.path, PRAGMAS)
+        self.writer = GroupCommitWriter()
+
+    def tearDown(self):
+        self.writer.stop()
+        db_connection.configure()
+        self.directory.cleanup()
+
+    def test_begin_busy_fails_the_batch(self):
+        holder = sqlite3.connect(self.path, isolation_level=None)
+        holder.execute("BEGIN IMMEDIATE")
+        try:
+            future = self.writer.submit(insert_user, 1)
+            with self.assertRaises(sqlite3.OperationalError):
+                future.result(timeout=10)
+        finally:
+            holder.execute("ROLLBACK")
+            holder.close()
+        self.assertEqual(self.writer.submit(insert_user, 2).result(timeout=10), 2)
+
+    def test_writer_restarts_after_connection_failure(self):
+        manager = db_connection.get_manager()
+        error = sqlite3.OperationalError("database is locked")
+        with patch.object(manager, "acquire", side_effect=error):
+            future = self.writer.submit(insert_user, 1)
+            with self.assertRaises(sqlite3.OperationalError):
+                future.result(timeout=10)
+        self.assertEqual(self.writer.submit(insert_user, 2).result(timeout=10), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,31 +1,88 @@
-import mysql.connector
 from mysql.connector import Error
 
+from checkpoint import resumable
+from db_pool import get_pool
+from pipeline_metrics import instrument
 
-def stream_users():
+# Rows read from the server per round trip in streaming mode
+PREFETCH = 1000
+
+
+def stream_users_after(after=None, prefetch=PREFETCH):
+    """
+    Stream rows in user_id order starting after user_id `after`.
+    Database errors are raised so the caller can reconnect.
+    :param after: Last user_id already processed, None for the first row
+    :param prefetch: Rows read from the server per round trip
+    """
+    with get_pool().connection() as connection:
+        cursor = connection.cursor(buffered=False)
+        if after is None:
+            cursor.execute("SELECT user_id, name, email, age FROM user_data "
+                           "ORDER BY user_id")
+        else:
+            cursor.execute("SELECT user_id, name, email, age FROM user_data "
+                           "WHERE user_id > %s ORDER BY user_id", (after,))
+        while True:
+            rows = cursor.fetchmany(prefetch)
+            if not rows:
+                break
+            yield from rows
+        cursor.close()
+
+
+@instrument('stream_users')
+def stream_users(streaming=False, prefetch=PREFETCH, row_factory=None,
+                 checkpoint=None):
     """
     A generator function that fetches rows one by one from the user_data table
     using a single loop and yield.
+    :param streaming: Read through an unbuffered cursor, holding at most
+        `prefetch` rows in memory at a time whatever the table size
+    :param prefetch: Size of the read-ahead window in streaming mode
+    :param row_factory: Optional function applied to every row, e.g.
+        user_row.convert_row or user_row.UserRow.from_db
+    :param checkpoint: checkpoint.Checkpoint to resume a long scan from. Rows
+        then come in user_id order, dropped connections are re-opened after
+        the last row processed, and the position is saved periodically
     """
+    if checkpoint is not None:
+        after = checkpoint.start('stream_users', {})
+        rows = resumable(lambda last: stream_users_after(last, prefetch),
+                         lambda row: row[0], after, checkpoint)
+        try:
+            for row in rows:
+                yield row if row_factory is None else row_factory(row)
+        except Error as e:
+            print(f"Error fetching users: {e}")
+        finally:
+            rows.close()
+        return
+
     try:
-        # Connect to ALX_prodev database
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',   # Change if necessary
-            password='',   # Add password if any
-            database='ALX_prodev'
-        )
-
-        if connection.is_connected():
-            cursor = connection.cursor()
-            cursor.execute("SELECT user_id, name, email, age FROM user_data;")
-
-            # Fetch rows one by one and yield
-            for row in cursor:
-                yield row
+        # Borrow a connection to ALX_prodev from the shared pool
+        with get_pool().connection() as connection:
+            if streaming:
+                cursor = connection.cursor(buffered=False)
+                cursor.execute("SELECT user_id, name, email, age FROM user_data;")
+
+                # Pull a fixed-size window from the server and yield it row by row
+                while True:
+                    rows = cursor.fetchmany(prefetch)
+                    if not rows:
+                        break
+                    if row_factory is not None:
+                        rows = map(row_factory, rows)
+                    yield from rows
+            else:
+                cursor = connection.cursor()
+                cursor.execute("SELECT user_id, name, email, age FROM user_data;")
+
+                # Fetch rows one by one and yield
+                for row in cursor:
+                    yield row if row_factory is None else row_factory(row)
 
             cursor.close()
-            connection.close()
 
     except Error as e:
         print(f"Error fetching users: {e}")
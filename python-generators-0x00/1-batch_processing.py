@@ -1,46 +1,150 @@
-import mysql.connector
+import time
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, residual filters then run per row
+    np = None
+
 from mysql.connector import Error
 
+from batch_sizer import AdaptiveBatchSizer
+from db_pool import get_pool
+from pipeline_metrics import instrument
+from prefetch import prefetched
+
+COLUMNS = ('user_id', 'name', 'email', 'age')
+OPERATORS = ('=', '!=', '<', '<=', '>', '>=')
+
+
+def build_query(columns=None, where=None):
+    """
+    Compile a projection and simple predicates into a user_data SELECT.
+    :param columns: Column names to fetch, defaults to all of COLUMNS
+    :param where: List of (column, operator, value) triples joined with AND
+    :return: (query, params)
+    """
+    columns = tuple(columns or COLUMNS)
+    for column in columns:
+        if column not in COLUMNS:
+            raise ValueError(f"Unknown column: {column}")
+
+    clauses, params = [], []
+    for column, operator, value in where or ():
+        if column not in COLUMNS:
+            raise ValueError(f"Unknown column: {column}")
+        if operator not in OPERATORS:
+            raise ValueError(f"Unsupported operator: {operator}")
+        clauses.append(f"{column} {operator} %s")
+        params.append(value)
+
+    query = f"SELECT {', '.join(columns)} FROM user_data"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    return query, params
 
-def stream_users_in_batches(batch_size):
+
+def filter_batch(batch, columns, residual):
+    """
+    Keep the rows of a batch for which residual() is true.
+    With NumPy, residual receives {column: array} for the whole batch and
+    returns a boolean mask; without it, it is called once per row with
+    {column: value}, so expressions like `cols['age'] % 2 == 0` work for both.
+    :return: List of matching rows
+    """
+    if np is not None:
+        arrays = {}
+        for i, column in enumerate(columns):
+            values = [row[i] for row in batch]
+            dtype = float if column == 'age' else object
+            arrays[column] = np.asarray(values, dtype=dtype)
+        mask = np.asarray(residual(arrays), dtype=bool)
+        return [batch[i] for i in np.flatnonzero(mask)]
+
+    matches = []
+    for row in batch:
+        values = dict(zip(columns, row))
+        if 'age' in values:
+            values['age'] = float(values['age'])
+        if residual(values):
+            matches.append(row)
+    return matches
+
+
+@instrument('stream_users_in_batches')
+def stream_users_in_batches(batch_size, streaming=False, columns=None,
+                            where=None, residual=None, prefetch=0, adaptive=None,
+                            row_factory=None):
     """
     Generator that fetches rows in batches from the user_data table.
     :param batch_size: Number of rows to fetch per batch
+    :param streaming: Read through an unbuffered cursor so only one batch
+        is held in memory at a time whatever the table size
+    :param columns: Columns to fetch, in order (default: all)
+    :param where: (column, operator, value) predicates evaluated by MySQL
+    :param residual: Filter applied per batch in Python, see filter_batch()
+    :param prefetch: Batches to fetch ahead on a background thread while the
+        caller works on the current one (0 disables read-ahead)
+    :param adaptive: AdaptiveBatchSizer that retunes the fetch size after
+        every batch, its report() shows where it settled; True uses a
+        default one starting at batch_size and prints the settled size
+    :param row_factory: Optional function applied to every row after
+        filtering, e.g. user_row.convert_row or user_row.UserRow.from_db
     :yield: List of rows (batch)
     """
-    try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',  # Change if necessary
-            password='',  # Add password if any
-            database='ALX_prodev'
-        )
+    announce = adaptive is True
+    if announce:
+        adaptive = AdaptiveBatchSizer(initial=batch_size)
 
-        if connection.is_connected():
-            cursor = connection.cursor()
-            cursor.execute("SELECT user_id, name, email, age FROM user_data;")
+    if prefetch:
+        # Call the undecorated generator so rows are not counted twice
+        source = stream_users_in_batches.__wrapped__(
+            batch_size, streaming, columns, where, residual,
+            adaptive=adaptive, row_factory=row_factory)
+        yield from prefetched(source, prefetch)
+        if announce:
+            print(f"Adaptive batch size settled at {adaptive.batch_size} rows")
+        return
+
+    columns = tuple(columns or COLUMNS)
+    query, params = build_query(columns, where)
+    try:
+        with get_pool().connection() as connection:
+            cursor = connection.cursor(buffered=False) if streaming else connection.cursor()
+            cursor.execute(query, params)
 
             while True:  
-                batch = cursor.fetchmany(batch_size)
+                if adaptive is None:
+                    batch = cursor.fetchmany(batch_size)
+                else:
+                    start = time.perf_counter()
+                    batch = cursor.fetchmany(adaptive.batch_size)
+                    adaptive.observe(batch, time.perf_counter() - start)
                 if not batch:
                     break
+                if residual is not None:
+                    batch = filter_batch(batch, columns, residual)
+                    if not batch:
+                        continue
+                if row_factory is not None:
+                    batch = [row_factory(row) for row in batch]
                 yield batch  
 
             cursor.close()
-            connection.close()
+            if announce:
+                print(f"Adaptive batch size settled at {adaptive.batch_size} rows")
 
     except Error as e:
         print(f"Error fetching users in batches: {e}")
 
 
+@instrument('batch_processing')
 def batch_processing(batch_size):
     """
     Processes each batch of users and filters users over age 25.
-    Uses generator for batch streaming.
+    Uses generator for batch streaming; the age filter runs in MySQL.
     :param batch_size: Number of rows per batch
-    :return: Users older than 25
+    :yield: Users older than 25
     """
-    for batch in stream_users_in_batches(batch_size):  
+    for batch in stream_users_in_batches(batch_size, where=[('age', '>', 25)]):
         for user in batch:  
-            if int(user[3]) > 25:
-                return user
+            yield user
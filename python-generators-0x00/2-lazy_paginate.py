@@ -1,6 +1,12 @@
-import mysql.connector
+import base64
+import json
+
 from mysql.connector import Error
 
+from checkpoint import resumable
+from db_pool import get_pool
+from pipeline_metrics import instrument
+
 
 def paginate_users(page_size, offset):
     """
@@ -10,20 +16,12 @@ def paginate_users(page_size, offset):
     :return: List of rows for this page
     """
     try:
-        connection = mysql.connector.connect(
-            host='localhost',
-            user='root',    # Update if needed
-            password='',    # Update if needed
-            database='ALX_prodev'
-        )
-
-        if connection.is_connected():
+        with get_pool().connection() as connection:
             cursor = connection.cursor()
-            query = f"SELECT * FROM user_data LIMIT {page_size} OFFSET {offset}"
+            query = "SELECT * FROM user_data LIMIT %s OFFSET %s"
             cursor.execute(query, (page_size, offset))
             rows = cursor.fetchall()
             cursor.close()
-            connection.close()
             return rows
 
     except Error as e:
@@ -31,13 +29,135 @@ def paginate_users(page_size, offset):
         return []
 
 
-def lazy_paginate(page_size):
+def encode_token(last_user_id):
+    """
+    Build an opaque continuation token from the last user_id of a page.
+    :param last_user_id: user_id of the last row already returned
+        (a string, or bytes for a BINARY(16) user_id column)
+    :return: URL-safe token string
+    """
+    if isinstance(last_user_id, (bytes, bytearray)):
+        state = {"after_hex": bytes(last_user_id).hex()}
+    else:
+        state = {"after": last_user_id}
+    payload = json.dumps(state).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+
+def decode_token(token):
+    """
+    Recover the last seen user_id from a continuation token.
+    :param token: Token returned by paginate_users_keyset(), or None
+    :return: last seen user_id, or None to start from the beginning
+    """
+    if not token:
+        return None
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token.encode()))
+        if "after_hex" in state:
+            return bytes.fromhex(state["after_hex"])
+        return state["after"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid continuation token: {token!r}") from e
+
+
+def fetch_page_after(page_size, after=None):
+    """
+    Fetch the page of users that follows user_id `after` in key order.
+    Unlike paginate_users_keyset(), database errors are raised.
+    :param page_size: Number of rows per page
+    :param after: Last user_id already seen, None for the first page
+    :return: List of rows
+    """
+    with get_pool().connection() as connection:
+        cursor = connection.cursor()
+        if after is None:
+            cursor.execute(
+                "SELECT user_id, name, email, age FROM user_data "
+                "ORDER BY user_id LIMIT %s",
+                (page_size,)
+            )
+        else:
+            cursor.execute(
+                "SELECT user_id, name, email, age FROM user_data "
+                "WHERE user_id > %s ORDER BY user_id LIMIT %s",
+                (after, page_size)
+            )
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+
+
+def paginate_users_keyset(page_size, token=None):
+    """
+    Fetch a single page of users ordered by user_id, resuming after the
+    last user_id seen instead of skipping rows with OFFSET. Every page is
+    a primary key range read, so page 10,000 costs the same as page 1.
+    :param page_size: Number of rows per page
+    :param token: Continuation token from the previous page, None for the first
+    :return: (rows, next_token); next_token is None once the table is exhausted
+    """
+    try:
+        rows = fetch_page_after(page_size, decode_token(token))
+        next_token = None
+        if len(rows) == page_size:
+            next_token = encode_token(rows[-1][0])
+        return rows, next_token
+
+    except Error as e:
+        print(f"Error fetching page: {e}")
+    return [], None
+
+
+def lazy_paginate_keyset(page_size, token=None):
+    """
+    Generator that walks user_data in keyset order.
+    :param page_size: Number of rows per page
+    :param token: Continuation token to resume from, None to start at the top
+    :yield: (page, next_token) so callers can persist where they stopped
+    """
+    while True:
+        page, token = paginate_users_keyset(page_size, token)
+        if not page:
+            break
+        yield page, token
+        if token is None:
+            break
+
+
+@instrument('lazy_paginate')
+def lazy_paginate(page_size, keyset=False, token=None, checkpoint=None):
     """
     Generator function to lazily fetch paginated data.
     Fetches one page at a time using paginate_users().
     :param page_size: Number of rows per page
+    :param keyset: Seek on user_id instead of using LIMIT/OFFSET; dropped
+        connections are re-opened and the walk continues after the last page
+    :param token: Continuation token to resume from (keyset mode only)
+    :param checkpoint: checkpoint.Checkpoint persisting the position so a
+        restarted job picks up where it stopped (implies keyset)
     :yield: A page (list of rows)
     """
+    if keyset or checkpoint is not None:
+        def open_scan(after):
+            while True:
+                page = fetch_page_after(page_size, after)
+                if not page:
+                    return
+                yield page
+                if len(page) < page_size:
+                    return
+                after = page[-1][0]
+
+        after = decode_token(token)
+        if checkpoint is not None:
+            checkpoint.start('lazy_paginate', {'page_size': page_size})
+        try:
+            yield from resumable(open_scan, lambda page: page[-1][0], after, checkpoint)
+        except Error as e:
+            print(f"Error fetching page: {e}")
+        return
+
     offset = 0
     while True:  # Only ONE loop
         page = paginate_users(page_size, offset)
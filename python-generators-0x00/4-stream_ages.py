@@ -1,23 +1,27 @@
-import mysql.connector
-
-# Database connection
-def connect_db():
-    return mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="yourpassword",
-        database="ALX_prodev"
-    )
+from db_pool import get_pool
+from pipeline_metrics import instrument
 
 # Generator to yield user ages one by one
+@instrument('stream_user_ages')
 def stream_user_ages():
-    conn = connect_db()
-    cursor = conn.cursor()
-    cursor.execute("SELECT age FROM user_data")
-    for (age,) in cursor:
-        yield age
-    cursor.close()
-    conn.close()
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT age FROM user_data")
+        for (age,) in cursor:
+            yield age
+        cursor.close()
+
+# Generator to yield user ages in batches (lists of ages)
+def stream_user_ages_in_batches(batch_size=1000):
+    with get_pool().connection() as conn:
+        cursor = conn.cursor(buffered=False)
+        cursor.execute("SELECT age FROM user_data")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [age for (age,) in rows]
+        cursor.close()
 
 # Function to calculate average age using generator without loading all data
 def calculate_average_age():
@@ -0,0 +1,263 @@
+import math
+from bisect import bisect_right
+from itertools import islice
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, batches fall back to plain Python
+    np = None
+
+from db_pool import get_pool
+
+stream_ages = __import__('4-stream_ages')
+
+BATCH_SIZE = 10000
+PERCENTILES = (0.5, 0.9, 0.99)
+COMPRESSION = 100   # t-digest size/accuracy trade-off, ~compression centroids
+BIN_WIDTH = 10      # Histogram bucket width in years
+MAX_AGE = 120       # Ages at or above this land in the last bucket
+
+
+class TDigest:
+    """
+    Mergeable quantile sketch in O(compression) memory (Dunning's
+    t-digest). Each batch is sorted, merged with the current centroids
+    and compressed in one pass: points are grouped by the arcsine scale
+    function of their cumulative rank, which keeps centroids small near
+    the tails so high percentiles stay accurate.
+    """
+
+    def __init__(self, compression=COMPRESSION):
+        self.compression = compression
+        self.means = []
+        self.weights = []
+        self.min = None
+        self.max = None
+
+    def _bin(self, q):
+        return int(self.compression * (math.asin(2 * q - 1) / math.pi + 0.5))
+
+    def add_batch(self, values):
+        """Fold a batch of observations (list or NumPy array) into the digest."""
+        if len(values) == 0:
+            return
+        if np is not None:
+            values = np.sort(np.asarray(values, dtype=float))
+            low, high = float(values[0]), float(values[-1])
+            means = np.concatenate((np.asarray(self.means, dtype=float), values))
+            weights = np.concatenate((np.asarray(self.weights, dtype=float),
+                                      np.ones(values.size)))
+            order = np.argsort(means, kind='mergesort')
+            means, weights = means[order], weights[order]
+            q = (np.cumsum(weights) - weights / 2) / weights.sum()
+            bins = (self.compression * (np.arcsin(2 * q - 1) / np.pi + 0.5)).astype(int)
+            totals = np.bincount(bins, weights=weights)
+            sums = np.bincount(bins, weights=means * weights)
+            used = totals > 0
+            self.means, self.weights = sums[used] / totals[used], totals[used]
+        else:
+            values = sorted(float(v) for v in values)
+            low, high = values[0], values[-1]
+            points = sorted(zip(list(self.means) + values,
+                                list(self.weights) + [1.0] * len(values)))
+            total = sum(w for _, w in points)
+            means, weights = [], []
+            seen, current, weighted_sum, weight = 0.0, None, 0.0, 0.0
+            for mean, w in points:
+                b = self._bin((seen + w / 2) / total)
+                seen += w
+                if b != current and weight:
+                    means.append(weighted_sum / weight)
+                    weights.append(weight)
+                    weighted_sum = weight = 0.0
+                current = b
+                weighted_sum += mean * w
+                weight += w
+            means.append(weighted_sum / weight)
+            weights.append(weight)
+            self.means, self.weights = means, weights
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    def quantile(self, p):
+        """Estimate of the p-quantile, or None before any observation."""
+        if self.min is None:
+            return None
+        if np is not None:
+            weights = np.asarray(self.weights, dtype=float)
+            mids = np.cumsum(weights) - weights / 2
+            return float(np.interp(p * weights.sum(), mids, self.means,
+                                   left=self.min, right=self.max))
+        mids, seen = [], 0.0
+        for w in self.weights:
+            mids.append(seen + w / 2)
+            seen += w
+        target = p * seen
+        i = bisect_right(mids, target)
+        if i == 0:
+            return self.min if target < mids[0] else self.means[0]
+        if i == len(mids):
+            return self.max if target > mids[-1] else self.means[-1]
+        fraction = (target - mids[i - 1]) / (mids[i] - mids[i - 1])
+        return self.means[i - 1] + fraction * (self.means[i] - self.means[i - 1])
+
+
+class AgeStats:
+    """
+    One-pass summary of a stream of ages: count, mean, variance, min/max,
+    a fixed-width histogram and approximate percentiles.
+    """
+
+    def __init__(self, percentiles=PERCENTILES, bin_width=BIN_WIDTH, max_age=MAX_AGE):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0          # Sum of squared deviations from the mean
+        self.min = None
+        self.max = None
+        self.bin_width = bin_width
+        self.edges = list(range(0, max_age + bin_width, bin_width))
+        self.bins = [0] * (len(self.edges) - 1)
+        self.percentiles = tuple(percentiles)
+        self.digest = TDigest()
+
+    def update(self, batch):
+        """
+        Fold a batch of ages into the running summary.
+        :param batch: Sequence of ages (int, float or Decimal)
+        """
+        if len(batch) == 0:
+            return
+        if np is not None:
+            values = np.asarray(batch, dtype=float)
+            n = values.size
+            batch_mean = float(values.mean())
+            batch_m2 = float(((values - batch_mean) ** 2).sum())
+            batch_min, batch_max = float(values.min()), float(values.max())
+            clipped = np.clip(values, self.edges[0], self.edges[-1])
+            counts, _ = np.histogram(clipped, bins=self.edges)
+            for i, c in enumerate(counts.tolist()):
+                self.bins[i] += c
+        else:
+            values = [float(v) for v in batch]
+            n = len(values)
+            batch_mean = sum(values) / n
+            batch_m2 = sum((v - batch_mean) ** 2 for v in values)
+            batch_min, batch_max = min(values), max(values)
+            last = len(self.bins) - 1
+            for v in values:
+                self.bins[min(max(bisect_right(self.edges, v) - 1, 0), last)] += 1
+
+        # Chan et al. parallel update of mean and M2
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += batch_m2 + delta * delta * self.count * n / total
+        self.count = total
+        self.min = batch_min if self.min is None else min(self.min, batch_min)
+        self.max = batch_max if self.max is None else max(self.max, batch_max)
+
+        if self.percentiles:
+            self.digest.add_batch(values)
+
+    def summary(self):
+        """
+        :return: dict with count, mean, variance, stddev, min, max,
+            histogram ({(low, high): count}) and percentiles ({p: value})
+        """
+        variance = self.m2 / self.count if self.count else 0.0
+        return {
+            'count': self.count,
+            'mean': self.mean if self.count else 0.0,
+            'variance': variance,
+            'stddev': math.sqrt(variance),
+            'min': self.min,
+            'max': self.max,
+            'histogram': {
+                (self.edges[i], self.edges[i + 1]): c for i, c in enumerate(self.bins)
+            },
+            'percentiles': {p: self.digest.quantile(p) for p in self.percentiles},
+        }
+
+
+def batched(iterable, size):
+    """Group a stream of single values into lists of at most size items."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def sql_age_stats(bin_width=BIN_WIDTH, max_age=MAX_AGE):
+    """
+    Compute the aggregates inside MySQL so no rows cross the wire.
+    Percentiles need row-level access and are not included.
+    :return: dict shaped like AgeStats.summary(), with empty percentiles
+    """
+    edges = list(range(0, max_age + bin_width, bin_width))
+    last = len(edges) - 2
+    with get_pool().connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT COUNT(age), AVG(age), VAR_POP(age), MIN(age), MAX(age) "
+            "FROM user_data"
+        )
+        count, mean, variance, low, high = cursor.fetchone()
+        cursor.execute(
+            "SELECT LEAST(GREATEST(FLOOR(age / %s), 0), %s) AS bucket, COUNT(*) "
+            "FROM user_data GROUP BY bucket",
+            (bin_width, last)
+        )
+        buckets = dict((int(b), c) for b, c in cursor.fetchall())
+        cursor.close()
+
+    variance = float(variance or 0)
+    return {
+        'count': count,
+        'mean': float(mean or 0),
+        'variance': variance,
+        'stddev': math.sqrt(variance),
+        'min': None if low is None else float(low),
+        'max': None if high is None else float(high),
+        'histogram': {
+            (edges[i], edges[i + 1]): buckets.get(i, 0) for i in range(last + 1)
+        },
+        'percentiles': {},
+    }
+
+
+def describe_ages(ages=None, batch_size=BATCH_SIZE, percentiles=PERCENTILES,
+                  bin_width=BIN_WIDTH, max_age=MAX_AGE, pushdown=False):
+    """
+    Summarize user ages in a single pass.
+    :param ages: Iterable of single ages such as stream_user_ages(); by
+        default ages are streamed from user_data in batches
+    :param batch_size: Ages fetched and vectorized per batch
+    :param percentiles: Quantiles to estimate, e.g. (0.5, 0.99)
+    :param pushdown: Let MySQL compute the aggregates (no percentiles)
+    :return: Summary dict, see AgeStats.summary()
+    """
+    if pushdown:
+        return sql_age_stats(bin_width, max_age)
+
+    if ages is None:
+        batches = stream_ages.stream_user_ages_in_batches(batch_size)
+    else:
+        batches = batched(ages, batch_size)
+
+    stats = AgeStats(percentiles, bin_width, max_age)
+    for batch in batches:
+        stats.update(batch)
+    return stats.summary()
+
+
+if __name__ == "__main__":
+    summary = describe_ages()
+    print(f"Users: {summary['count']}")
+    print(f"Mean age: {summary['mean']:.2f} (stddev {summary['stddev']:.2f})")
+    print(f"Min/max age: {summary['min']} / {summary['max']}")
+    for p, value in summary['percentiles'].items():
+        print(f"p{p * 100:g}: {value:.1f}")
+    for (low, high), count in summary['histogram'].items():
+        print(f"{low:>3}-{high:<3} {count}")
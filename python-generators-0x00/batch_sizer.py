@@ -0,0 +1,74 @@
+import sys
+
+TARGET_LATENCY = 0.05           # Seconds a single fetchmany should take
+MAX_BATCH_BYTES = 8 * 1024 ** 2  # Memory ceiling for one batch
+MIN_SIZE = 10
+MAX_SIZE = 100000
+SMOOTHING = 0.3                 # Weight of the newest measurement
+SAMPLE_ROWS = 8                 # Rows measured per batch for the byte estimate
+
+
+def row_bytes(row):
+    """Approximate Python memory held by one row tuple and its values."""
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+
+
+class AdaptiveBatchSizer:
+    """
+    Tune the fetchmany size from measured fetch time and row size.
+
+    After each batch the next size is chosen so that one fetch takes about
+    `target_latency` seconds without the batch exceeding `max_bytes`,
+    growing or shrinking by at most a factor of two per step.
+    """
+
+    def __init__(self, initial=100, target_latency=TARGET_LATENCY,
+                 max_bytes=MAX_BATCH_BYTES, min_size=MIN_SIZE, max_size=MAX_SIZE):
+        self.batch_size = initial
+        self.target_latency = target_latency
+        self.max_bytes = max_bytes
+        self.min_size = min_size
+        self.max_size = max_size
+        self.seconds_per_row = None
+        self.bytes_per_row = None
+        self.batches = 0
+
+    def _smooth(self, previous, value):
+        if previous is None:
+            return value
+        return previous + SMOOTHING * (value - previous)
+
+    def observe(self, batch, seconds):
+        """
+        Record how long fetching `batch` took and pick the next size.
+        :return: The batch size to request next
+        """
+        if not batch:
+            return self.batch_size
+        self.batches += 1
+        step = max(1, len(batch) // SAMPLE_ROWS)
+        sample = batch[::step][:SAMPLE_ROWS]
+        self.seconds_per_row = self._smooth(self.seconds_per_row, seconds / len(batch))
+        self.bytes_per_row = self._smooth(
+            self.bytes_per_row, sum(row_bytes(row) for row in sample) / len(sample))
+
+        by_latency = self.target_latency / max(self.seconds_per_row, 1e-9)
+        by_memory = self.max_bytes / self.bytes_per_row
+        wanted = min(by_latency, by_memory, self.batch_size * 2)
+        wanted = max(wanted, self.batch_size / 2)
+        self.batch_size = int(min(max(wanted, self.min_size), self.max_size))
+        return self.batch_size
+
+    def report(self):
+        """
+        :return: dict with the settled batch_size and the measurements
+            it is based on
+        """
+        return {
+            'batch_size': self.batch_size,
+            'batches': self.batches,
+            'seconds_per_row': self.seconds_per_row,
+            'bytes_per_row': self.bytes_per_row,
+            'target_latency': self.target_latency,
+            'max_bytes': self.max_bytes,
+        }
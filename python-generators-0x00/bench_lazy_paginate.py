@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Compare page latency of OFFSET pagination and keyset pagination.
+
+Run against a seeded ALX_prodev database with a few million rows in
+user_data. The keyset column should stay flat from page 1 to page 10,000
+while the offset column grows with the page number.
+
+    python3 bench_lazy_paginate.py [page_size]
+"""
+import sys
+import time
+
+lazy_paginate = __import__('2-lazy_paginate')
+
+CHECKPOINTS = (1, 10, 100, 1000, 10000)
+
+
+def time_offset_page(page_size, page_number):
+    """Time a single OFFSET page, seeking straight to page_number."""
+    start = time.perf_counter()
+    lazy_paginate.paginate_users(page_size, (page_number - 1) * page_size)
+    return time.perf_counter() - start
+
+
+def time_keyset_pages(page_size, last_page):
+    """Walk the table with keyset pages and time the checkpoint pages."""
+    timings = {}
+    token = None
+    for page_number in range(1, last_page + 1):
+        start = time.perf_counter()
+        page, token = lazy_paginate.paginate_users_keyset(page_size, token)
+        elapsed = time.perf_counter() - start
+        if page_number in CHECKPOINTS:
+            timings[page_number] = elapsed
+        if token is None:
+            break
+    return timings
+
+
+def main(page_size=100):
+    keyset = time_keyset_pages(page_size, max(CHECKPOINTS))
+    print(f"page_size={page_size}")
+    print(f"{'page':>8} {'offset (ms)':>12} {'keyset (ms)':>12}")
+    for page_number in CHECKPOINTS:
+        if page_number not in keyset:
+            break
+        offset = time_offset_page(page_size, page_number)
+        print(f"{page_number:>8} {offset * 1000:>12.2f} "
+              f"{keyset[page_number] * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Compare memory and build/stream cost of the user_data row formats:
+
+- CHAR(36) rows as the driver returns them: (str, str, str, Decimal)
+- BINARY(16) rows with an int age: (bytes, str, str, int)
+- UserRow objects with __slots__, a 16-byte user_id and an int age
+
+    python3 bench_row_format.py [rows] [--db]
+
+With --db it also times a full stream of user_data through each row
+factory and prints the table's data and index size.
+"""
+import sys
+import time
+import tracemalloc
+import uuid
+from decimal import Decimal
+
+from db_pool import get_pool
+from user_row import UserRow, convert_row
+
+stream_users = __import__('0-stream_users')
+
+
+def char36_rows(n):
+    return [(str(uuid.uuid4()), f"User {i}", f"user{i}@example.com", Decimal(i % 100))
+            for i in range(n)]
+
+
+def binary16_rows(n):
+    return [(uuid.uuid4().bytes, f"User {i}", f"user{i}@example.com", i % 100)
+            for i in range(n)]
+
+
+def user_rows(n):
+    return [UserRow(uuid.uuid4().bytes, f"User {i}", f"user{i}@example.com", i % 100)
+            for i in range(n)]
+
+
+def measure(build):
+    """Return (seconds, bytes) needed to build and hold the result of build()."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return elapsed, size
+
+
+def compare_in_memory(n):
+    cases = [
+        ("CHAR(36) tuples, Decimal age", char36_rows),
+        ("BINARY(16) tuples, int age", binary16_rows),
+        ("UserRow (__slots__)", user_rows),
+    ]
+    print(f"{n} rows")
+    print(f"{'format':<30} {'bytes/row':>10} {'build (ms)':>11}")
+    for label, build in cases:
+        elapsed, size = measure(lambda: build(n))
+        print(f"{label:<30} {size / n:>10.0f} {elapsed * 1000:>11.1f}")
+
+
+def compare_database():
+    with get_pool().connection() as connection:
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT data_length, index_length FROM information_schema.tables "
+            "WHERE table_schema = DATABASE() AND table_name = 'user_data'"
+        )
+        data_length, index_length = cursor.fetchone()
+        cursor.close()
+    print(f"user_data: data {data_length} bytes, indexes {index_length} bytes")
+
+    for label, factory in (("raw rows", None), ("convert_row", convert_row),
+                           ("UserRow.from_db", UserRow.from_db)):
+        start = time.perf_counter()
+        count = sum(1 for _ in stream_users.stream_users(streaming=True,
+                                                         row_factory=factory))
+        elapsed = time.perf_counter() - start
+        print(f"{label:<16} {count} rows in {elapsed:.2f}s "
+              f"({count / elapsed if elapsed else 0:.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if a != '--db']
+    compare_in_memory(int(args[0]) if args else 100000)
+    if '--db' in sys.argv:
+        compare_database()
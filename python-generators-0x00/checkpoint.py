@@ -0,0 +1,134 @@
+import json
+import os
+import tempfile
+import time
+
+from mysql.connector.errors import InterfaceError, OperationalError
+
+# Errors raised when the server goes away or the connection drops
+TRANSIENT_ERRORS = (InterfaceError, OperationalError)
+MAX_RETRIES = 5
+RETRY_DELAY = 1.0       # Seconds, multiplied by the attempt number
+INTERVAL = 1000         # Items consumed between checkpoint writes
+
+
+def _dump_key(key):
+    if isinstance(key, (bytes, bytearray)):
+        return {'hex': bytes(key).hex()}
+    return key
+
+
+def _load_key(value):
+    if isinstance(value, dict):
+        return bytes.fromhex(value['hex'])
+    return value
+
+
+class Checkpoint:
+    """
+    Resume token for a keyset scan, persisted to a small JSON file.
+
+    The token holds the scan name, its parameters and the key of the last
+    item the consumer finished with. An item counts as finished once the
+    consumer asks for the next one, so reconnects inside a run neither
+    repeat nor skip rows. The file is written every `interval` items and
+    when the scan stops, so after a hard crash at most `interval` finished
+    items are handed out again; use interval=1 where that matters.
+    """
+
+    def __init__(self, path, interval=INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.scan = None
+        self.params = None
+        self.after = None
+        self._pending = 0
+
+    def start(self, scan, params):
+        """
+        Bind the checkpoint to a scan and load the saved position.
+        :return: Last finished key, or None to start from the beginning
+        :raises ValueError: The file belongs to a different scan
+        """
+        self.scan, self.params, self.after = scan, params, None
+        if os.path.exists(self.path):
+            with open(self.path) as file:
+                state = json.load(file)
+            if state['scan'] != scan or state['params'] != params:
+                raise ValueError(
+                    f"Checkpoint {self.path} was written for {state['scan']} "
+                    f"{state['params']}, not {scan} {params}"
+                )
+            self.after = _load_key(state['after'])
+        return self.after
+
+    def record(self, key):
+        """Mark `key` as finished, writing the file every `interval` calls."""
+        self.after = key
+        self._pending += 1
+        if self._pending >= self.interval:
+            self.save()
+
+    def save(self):
+        """Atomically write the current position."""
+        state = {'scan': self.scan, 'params': self.params,
+                 'after': _dump_key(self.after)}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as file:
+            json.dump(state, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+        self._pending = 0
+
+    def complete(self):
+        """The scan finished; remove the file so the next run starts over."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self._pending = 0
+
+
+def resumable(open_scan, key_of, after=None, checkpoint=None,
+              retries=MAX_RETRIES, delay=RETRY_DELAY):
+    """
+    Generator that re-opens a keyset scan after transient connection errors.
+    :param open_scan: Function taking the last finished key (or None) and
+        returning an iterator over the items that follow it in key order
+    :param key_of: Function returning the key of an item
+    :param after: Key to start after when the checkpoint has no position
+    :param checkpoint: Optional Checkpoint, already bound with start()
+    :param retries: Consecutive failures tolerated before giving up
+    :param delay: Base back-off between reconnect attempts, in seconds
+    :yield: The items, each exactly once
+    """
+    if checkpoint is not None:
+        if checkpoint.after is not None:
+            after = checkpoint.after
+        checkpoint.after = after
+    failures = 0
+    while True:
+        try:
+            for item in open_scan(after):
+                failures = 0
+                yield item
+                # The consumer came back for more, so this item is done
+                after = key_of(item)
+                if checkpoint is not None:
+                    checkpoint.record(after)
+            break
+        except TRANSIENT_ERRORS as e:
+            failures += 1
+            if failures > retries:
+                if checkpoint is not None:
+                    checkpoint.save()
+                raise
+            print(f"Connection lost ({e}); resuming after {after!r} "
+                  f"(attempt {failures}/{retries})")
+            time.sleep(delay * failures)
+        except GeneratorExit:
+            if checkpoint is not None:
+                checkpoint.save()
+            raise
+    if checkpoint is not None:
+        checkpoint.complete()
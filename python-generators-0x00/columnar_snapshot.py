@@ -0,0 +1,221 @@
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import uuid
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, columns are then memoryviews
+    np = None
+
+from user_row import encode_user_id
+
+stream_users_module = __import__('0-stream_users')
+
+MAGIC = b'UDSNAP01'
+# magic, row count, then the byte offset of each section
+HEADER = struct.Struct('<8sQQQQQQQ')
+ALIGN = 8
+BATCH_SIZE = 10000
+
+# Snapshot layout (all integers little-endian, sections 8-byte aligned):
+#
+#     header          magic, rows, offsets of the six sections below
+#     user_ids        rows x 16 bytes, raw UUID bytes
+#     ages            rows x uint16
+#     name_offsets    (rows + 1) x uint64 into name_data
+#     name_data       UTF-8 names back to back
+#     email_offsets   (rows + 1) x uint64 into email_data
+#     email_data      UTF-8 emails back to back
+
+
+def _little_endian(values):
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def _pad(file):
+    file.write(b'\0' * (-file.tell() % ALIGN))
+
+
+def write_snapshot(path, rows=None, batch_size=BATCH_SIZE):
+    """
+    Write user_data into a columnar snapshot file in a single pass.
+    :param path: Destination file, replaced atomically when complete
+    :param rows: Iterable of (user_id, name, email, age) rows; by default
+        user_data is streamed from MySQL
+    :return: Number of rows written
+    """
+    if rows is None:
+        rows = stream_users_module.stream_users(streaming=True, prefetch=batch_size)
+
+    # Each column is spooled to its own temporary file, then concatenated
+    ids, ages, names, emails = (tempfile.TemporaryFile() for _ in range(4))
+    name_offsets, email_offsets = tempfile.TemporaryFile(), tempfile.TemporaryFile()
+    name_end = email_end = count = 0
+    age_batch, name_batch, email_batch = array('H'), array('Q', [0]), array('Q', [0])
+
+    def flush():
+        for values, file in ((age_batch, ages), (name_batch, name_offsets),
+                             (email_batch, email_offsets)):
+            file.write(_little_endian(values).tobytes())
+            del values[:]
+
+    try:
+        for user_id, name, email, age in rows:
+            ids.write(encode_user_id(user_id))
+            name_bytes, email_bytes = name.encode(), email.encode()
+            names.write(name_bytes)
+            emails.write(email_bytes)
+            name_end += len(name_bytes)
+            email_end += len(email_bytes)
+            age_batch.append(int(age))
+            name_batch.append(name_end)
+            email_batch.append(email_end)
+            count += 1
+            if len(age_batch) >= batch_size:
+                flush()
+        flush()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as out:
+            out.write(b'\0' * HEADER.size)
+            offsets = []
+            for section in (ids, ages, name_offsets, names, email_offsets, emails):
+                _pad(out)
+                offsets.append(out.tell())
+                section.seek(0)
+                shutil.copyfileobj(section, out)
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, count, *offsets))
+        os.replace(tmp_path, path)
+    finally:
+        for file in (ids, ages, names, emails, name_offsets, email_offsets):
+            file.close()
+    return count
+
+
+class Snapshot:
+    """
+    Read-only, memory-mapped view of a snapshot written by write_snapshot().
+
+    Columns are views straight into the mapped file: NumPy arrays when
+    NumPy is installed, memoryviews otherwise. Nothing is copied until a
+    row is materialized.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.rows, *offsets = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a user_data snapshot")
+        (self._ids_at, self._ages_at, self._name_offsets_at, self._names_at,
+         self._email_offsets_at, self._emails_at) = offsets
+
+        n = self.rows
+        if np is not None:
+            buffer = self._mmap
+            self.user_ids = np.frombuffer(buffer, dtype='V16', count=n, offset=self._ids_at)
+            self.ages = np.frombuffer(buffer, dtype='<u2', count=n, offset=self._ages_at)
+            self.name_offsets = np.frombuffer(buffer, dtype='<u8', count=n + 1,
+                                              offset=self._name_offsets_at)
+            self.email_offsets = np.frombuffer(buffer, dtype='<u8', count=n + 1,
+                                               offset=self._email_offsets_at)
+        else:
+            view = memoryview(self._mmap)
+            self.user_ids = view[self._ids_at:self._ids_at + 16 * n]
+            self.ages = view[self._ages_at:self._ages_at + 2 * n].cast('H')
+            self.name_offsets = view[self._name_offsets_at:
+                                     self._name_offsets_at + 8 * (n + 1)].cast('Q')
+            self.email_offsets = view[self._email_offsets_at:
+                                      self._email_offsets_at + 8 * (n + 1)].cast('Q')
+
+    def __len__(self):
+        return self.rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def close(self):
+        """
+        Close the file and unmap the snapshot. If column arrays taken from
+        it are still referenced elsewhere, the map stays alive until the
+        last of them is released; close() does not raise.
+        """
+        # Views must be released before the map can be closed
+        self.user_ids = self.ages = self.name_offsets = self.email_offsets = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+        self._mmap = None
+        self._file.close()
+
+    def _string(self, offsets, data_at, i):
+        start, end = int(offsets[i]), int(offsets[i + 1])
+        return self._mmap[data_at + start:data_at + end].decode()
+
+    def user_id(self, i):
+        start = self._ids_at + 16 * i
+        return str(uuid.UUID(bytes=self._mmap[start:start + 16]))
+
+    def name(self, i):
+        return self._string(self.name_offsets, self._names_at, i)
+
+    def email(self, i):
+        return self._string(self.email_offsets, self._emails_at, i)
+
+    def row(self, i):
+        """:return: (user_id, name, email, age) like the database rows"""
+        return self.user_id(i), self.name(i), self.email(i), int(self.ages[i])
+
+    def stream_users(self):
+        """Generator yielding every row, like 0-stream_users.stream_users()."""
+        for i in range(self.rows):
+            yield self.row(i)
+
+    def stream_users_in_batches(self, batch_size):
+        """Generator yielding lists of rows, like stream_users_in_batches()."""
+        for start in range(0, self.rows, batch_size):
+            yield [self.row(i) for i in range(start, min(start + batch_size, self.rows))]
+
+    def stream_user_ages(self):
+        """Generator yielding every age, like 4-stream_ages.stream_user_ages()."""
+        for age in self.ages:
+            yield int(age)
+
+    def users_older_than(self, age):
+        """Generator yielding rows with age > `age`, like batch_processing()."""
+        if np is not None:
+            matches = np.flatnonzero(self.ages > age)
+        else:
+            matches = (i for i, value in enumerate(self.ages) if value > age)
+        for i in matches:
+            yield self.row(int(i))
+
+    def average_age(self):
+        """Mean age computed straight from the mapped column."""
+        if not self.rows:
+            return 0.0
+        if np is not None:
+            return float(self.ages.mean())
+        return sum(self.ages) / self.rows
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else 'user_data.snap'
+    print(f"Wrote {write_snapshot(target)} rows to {target}")
+    with Snapshot(target) as snapshot:
+        print(f"Average age of users: {snapshot.average_age():.2f}")
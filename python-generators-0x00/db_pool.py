@@ -0,0 +1,196 @@
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import Error
+
+# Connection settings for the ALX_prodev database
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',      # Change if necessary
+    'password': '',      # Add password if any
+    'database': 'ALX_prodev',
+}
+
+POOL_SIZE = 5           # Maximum number of open connections
+IDLE_TIMEOUT = 300      # Seconds an idle connection is kept before eviction
+ACQUIRE_TIMEOUT = 30    # Seconds to wait for a free connection
+
+
+class ConnectionPool:
+    """
+    A small thread-safe pool of MySQL connections.
+
+    Connections are created lazily up to `size`, checked with a ping
+    before being handed out, and closed once they have been idle for
+    longer than `idle_timeout` seconds.
+    """
+
+    def __init__(self, size=POOL_SIZE, idle_timeout=IDLE_TIMEOUT,
+                 acquire_timeout=ACQUIRE_TIMEOUT, **config):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.config = {**DB_CONFIG, **config}
+        self._idle = []          # (connection, released_at), most recent last
+        self._open = 0
+        self._lock = threading.Condition()
+
+    def _is_healthy(self, connection):
+        """Ping the server without reconnecting."""
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Error:
+            return False
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Error:
+            pass
+
+    def _evict_idle(self):
+        """
+        Take connections idle for longer than idle_timeout out of the pool.
+        Lock held; the caller closes them after releasing it.
+        :return: List of expired connections
+        """
+        cutoff = time.monotonic() - self.idle_timeout
+        keep, expired = [], []
+        for connection, released_at in self._idle:
+            if released_at < cutoff:
+                expired.append(connection)
+                self._open -= 1
+            else:
+                keep.append((connection, released_at))
+        self._idle = keep
+        return expired
+
+    def acquire(self):
+        """
+        Borrow a connection, waiting up to acquire_timeout seconds.
+        :return: An open MySQL connection
+        """
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            candidate, reserved = None, False
+            with self._lock:
+                while True:
+                    expired = self._evict_idle()
+                    if self._idle:
+                        candidate, _ = self._idle.pop()
+                        break
+                    if self._open < self.size:
+                        self._open += 1
+                        reserved = True
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._lock.wait(remaining):
+                        raise Error(msg="Timed out waiting for a pooled connection")
+            # Network round trips happen outside the lock so a slow server
+            # does not stall every other acquire() and release()
+            for connection in expired:
+                self._close(connection)
+            if reserved:
+                break
+            if self._is_healthy(candidate):
+                return candidate
+            self._close(candidate)
+            with self._lock:
+                self._open -= 1
+                self._lock.notify()
+
+        try:
+            return mysql.connector.connect(**self.config)
+        except Exception:
+            with self._lock:
+                self._open -= 1
+                self._lock.notify()
+            raise
+
+    def release(self, connection, discard=False):
+        """
+        Return a connection to the pool.
+        :param connection: Connection obtained from acquire()
+        :param discard: Close the connection instead of reusing it
+        """
+        # A consumer that stops reading half way through an unbuffered
+        # result leaves rows on the wire; reading them all back could take
+        # minutes on a big table, so the connection is dropped instead.
+        if getattr(connection, 'unread_result', False):
+            discard = True
+        if not discard:
+            try:
+                connection.rollback()
+            except Error:
+                discard = True
+
+        if discard:
+            self._close(connection)
+        with self._lock:
+            if discard:
+                self._open -= 1
+            else:
+                self._idle.append((connection, time.monotonic()))
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for the duration of a with block.
+
+        Generators that are abandoned early are closed with GeneratorExit,
+        which unwinds through here and hands the connection back for reuse;
+        release() still drops it if rows were left unread. Connections are
+        only discarded outright when the block raised an error.
+        """
+        connection = self.acquire()
+        discard = False
+        try:
+            yield connection
+        except Exception:
+            discard = True
+            raise
+        finally:
+            self.release(connection, discard=discard)
+
+    def close(self):
+        """Close every idle connection."""
+        with self._lock:
+            for connection, _ in self._idle:
+                self._close(connection)
+                self._open -= 1
+            self._idle = []
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Return the process-wide pool, creating it on first use.
+    :return: ConnectionPool shared by the generator modules
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def configure_pool(size=POOL_SIZE, idle_timeout=IDLE_TIMEOUT,
+                   acquire_timeout=ACQUIRE_TIMEOUT, **config):
+    """
+    Replace the shared pool, e.g. to change its size or credentials.
+    Keyword arguments override the matching keys of DB_CONFIG.
+    :return: The new ConnectionPool
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(size, idle_timeout, acquire_timeout, **config)
+        return _pool
@@ -0,0 +1,251 @@
+import multiprocessing
+import os
+import pickle
+import queue
+import tempfile
+import threading
+
+import mysql.connector
+from mysql.connector import Error
+
+from db_pool import get_pool
+
+BATCH_SIZE = 1000
+QUEUE_DEPTH = 4     # Batches buffered per partition before a worker waits (or spills)
+POLL_INTERVAL = 1.0  # Seconds between checks that silent workers are still alive
+
+_ROWS, _DONE, _ERROR, _SPILL = 'rows', 'done', 'error', 'spill'
+
+
+def key_ranges(partitions, binary_ids=False):
+    """
+    Split the user_id key space into contiguous [low, high) ranges.
+    user_id is a random uuid4, so cutting the leading 32 bits into
+    equal slices gives partitions of roughly equal size.
+    :param partitions: Number of ranges
+    :param binary_ids: user_id is stored as BINARY(16); bounds are bytes
+    :return: List of (low, high) tuples; None means unbounded
+    """
+    bounds = [format(i * 16 ** 8 // partitions, '08x') for i in range(1, partitions)]
+    if binary_ids:
+        bounds = [bytes.fromhex(bound) for bound in bounds]
+    bounds = [None] + bounds + [None]
+    return list(zip(bounds, bounds[1:]))
+
+
+def scan_range(config, low, high, batch_size=BATCH_SIZE, connection=None):
+    """
+    Generator that streams one key range over its own connection.
+    :param config: mysql.connector.connect() keyword arguments
+    :param low: Inclusive lower user_id bound, or None
+    :param high: Exclusive upper user_id bound, or None
+    :param connection: Read over this open connection (e.g. inside a
+        caller's transaction) instead of opening one; it is left open
+    :yield: Lists of (user_id, name, email, age) rows in user_id order
+    """
+    clauses, params = [], []
+    if low is not None:
+        clauses.append("user_id >= %s")
+        params.append(low)
+    if high is not None:
+        clauses.append("user_id < %s")
+        params.append(high)
+    query = "SELECT user_id, name, email, age FROM user_data"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " ORDER BY user_id"
+
+    owned = connection is None
+    if owned:
+        connection = mysql.connector.connect(**config)
+    try:
+        cursor = connection.cursor(buffered=False)
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+        cursor.close()
+    finally:
+        if owned:
+            try:
+                connection.close()
+            except Error:
+                pass
+
+
+def _put(out, message, stop):
+    """Put on a bounded queue, giving up once the consumer has gone away."""
+    while not stop.is_set():
+        try:
+            out.put(message, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+class _Spill:
+    """Batches a worker could not hand over yet, pickled to a local temp file"""
+
+    def __init__(self):
+        fd, self.path = tempfile.mkstemp(prefix='partition-', suffix='.spill')
+        self.file = os.fdopen(fd, 'wb')
+
+    def write(self, payload):
+        pickle.dump(payload, self.file, pickle.HIGHEST_PROTOCOL)
+
+    def close(self):
+        self.file.close()
+
+
+def _read_spill(path):
+    """Yield the batches of a spill file in order, deleting it afterwards."""
+    try:
+        with open(path, 'rb') as file:
+            while True:
+                try:
+                    yield pickle.load(file)
+                except EOFError:
+                    return
+    finally:
+        _remove(path)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _scan_worker(index, config, low, high, batch_size, transform, out, stop, spill_ok):
+    """
+    Thread or process body: stream one range into the output queue.
+    With spill_ok, batches that do not fit in the queue go to a spill file
+    instead of blocking, so the server never waits on a slow consumer.
+    """
+    spill = None
+    try:
+        for rows in scan_range(config, low, high, batch_size):
+            if stop.is_set():
+                return
+            payload = transform(rows) if transform else rows
+            if spill is None and spill_ok:
+                try:
+                    out.put_nowait((index, _ROWS, payload))
+                    continue
+                except queue.Full:
+                    spill = _Spill()
+            if spill is not None:
+                spill.write(payload)
+            elif not _put(out, (index, _ROWS, payload), stop):
+                return
+        if spill is not None:
+            spill.close()
+            if not _put(out, (index, _SPILL, spill.path), stop):
+                return
+            spill = None
+        _put(out, (index, _DONE, None), stop)
+    except Exception as e:
+        # Driver exceptions do not always pickle, so send the message only
+        _put(out, (index, _ERROR, f"{type(e).__name__}: {e}"), stop)
+    finally:
+        if spill is not None:
+            spill.close()
+            _remove(spill.path)
+
+
+def partitioned_scan(partitions=4, ordered=False, processes=False,
+                     batch_size=BATCH_SIZE, transform=None, binary_ids=False):
+    """
+    Scan user_data with one worker and one connection per key range and
+    merge the results into a single generator.
+    :param partitions: Number of key ranges scanned in parallel
+    :param ordered: Yield in user_id order instead of as ready. Every range
+        is still read at full speed: batches of later ranges beyond
+        QUEUE_DEPTH are spilled to temporary files and read back when their
+        turn comes, so no connection sits half-read until the server's
+        net_write_timeout drops it
+    :param processes: Use worker processes instead of threads; pair with
+        `transform` so the per-row work runs on every core
+    :param batch_size: Rows fetched per round trip
+    :param transform: Optional picklable function applied to each batch in
+        the worker; its results are yielded instead of rows (and must be
+        picklable too)
+    :param binary_ids: user_id is stored as BINARY(16)
+    :yield: Rows, or transform(batch) results
+    :raises Error: A worker failed or exited without finishing its range
+    """
+    config = dict(get_pool().config)
+    ranges = key_ranges(partitions, binary_ids)
+    if processes:
+        Worker, make_queue, stop = (multiprocessing.Process, multiprocessing.Queue,
+                                    multiprocessing.Event())
+    else:
+        Worker, make_queue, stop = threading.Thread, queue.Queue, threading.Event()
+
+    if ordered:
+        queues = [make_queue(QUEUE_DEPTH) for _ in ranges]
+    else:
+        queues = [make_queue(QUEUE_DEPTH * partitions)] * len(ranges)
+
+    workers = [
+        Worker(target=_scan_worker,
+               args=(i, config, low, high, batch_size, transform, queues[i], stop, ordered),
+               daemon=True)
+        for i, (low, high) in enumerate(ranges)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def emit(payload):
+        if transform:
+            yield payload
+        else:
+            yield from payload
+
+    def drain(out, indices):
+        pending = set(indices)
+        while pending:
+            try:
+                index, kind, payload = out.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                # A worker that died (OOM, segfault) never sends _DONE
+                dead = [i for i in pending if not workers[i].is_alive()]
+                if dead and out.empty():
+                    raise Error(msg=f"Partition scan failed: worker for range "
+                                    f"{dead[0]} exited without finishing")
+                continue
+            if kind == _DONE:
+                pending.discard(index)
+            elif kind == _ERROR:
+                raise Error(msg=f"Partition scan failed: {payload}")
+            elif kind == _SPILL:
+                for batch in _read_spill(payload):
+                    yield from emit(batch)
+            else:
+                yield from emit(payload)
+
+    try:
+        if ordered:
+            for i, out in enumerate(queues):
+                yield from drain(out, [i])
+        else:
+            yield from drain(queues[0], range(len(workers)))
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join(timeout=1)
+            if processes and worker.is_alive():
+                worker.terminate()
+        # Spill files announced but never consumed
+        for out in set(queues):
+            while True:
+                try:
+                    _, kind, payload = out.get_nowait()
+                except (queue.Empty, OSError, ValueError):
+                    break
+                if kind == _SPILL:
+                    _remove(payload)
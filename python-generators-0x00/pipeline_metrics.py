@@ -0,0 +1,180 @@
+import functools
+import logging
+import threading
+import time
+
+from batch_sizer import SAMPLE_ROWS, row_bytes
+
+logger = logging.getLogger(__name__)
+
+LOG_INTERVAL = 10.0     # Seconds between periodic log lines per stage
+
+_enabled = False
+_log_interval = LOG_INTERVAL
+_stages = {}
+_stages_lock = threading.Lock()
+
+
+class StageMetrics:
+    """
+    Counters for one generator stage.
+
+    `blocked_seconds` is time spent inside the generator producing the next
+    item (execute/fetchmany and anything upstream); `consumer_seconds` is
+    time between handing an item out and being asked for the next one.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.bytes = 0
+        self.batches = 0
+        self.blocked_seconds = 0.0
+        self.consumer_seconds = 0.0
+        self.first_row_seconds = None
+        self.started = None
+        self._last_log = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, item, blocked, since_start):
+        """Account for one item produced after `blocked` seconds."""
+        batch = isinstance(item, list)
+        if batch:
+            rows = len(item)
+            sample = item[::max(1, rows // SAMPLE_ROWS)][:SAMPLE_ROWS]
+            size = sum(_item_bytes(row) for row in sample) * rows // max(1, len(sample))
+        else:
+            rows, size = 1, _item_bytes(item)
+
+        with self._lock:
+            if self.started is None:
+                self.started = time.monotonic() - since_start
+            if self.first_row_seconds is None and rows:
+                self.first_row_seconds = since_start
+            self.rows += rows
+            self.bytes += size
+            if batch:
+                self.batches += 1
+            self.blocked_seconds += blocked
+            due = time.monotonic() - self._last_log >= _log_interval
+            if due:
+                self._last_log = time.monotonic()
+        if due:
+            logger.info(format_line(self.snapshot()))
+
+    def record_consumer(self, seconds):
+        with self._lock:
+            self.consumer_seconds += seconds
+
+    def snapshot(self):
+        """:return: dict of counters and derived rates for this stage"""
+        with self._lock:
+            elapsed = time.monotonic() - self.started if self.started else 0.0
+            return {
+                'stage': self.name,
+                'rows': self.rows,
+                'bytes': self.bytes,
+                'batches': self.batches,
+                'elapsed_seconds': elapsed,
+                'rows_per_second': self.rows / elapsed if elapsed else 0.0,
+                'bytes_per_second': self.bytes / elapsed if elapsed else 0.0,
+                'blocked_seconds': self.blocked_seconds,
+                'consumer_seconds': self.consumer_seconds,
+                'first_row_seconds': self.first_row_seconds,
+            }
+
+
+def _item_bytes(item):
+    if isinstance(item, tuple):
+        return row_bytes(item)
+    try:
+        return row_bytes(tuple(item))
+    except TypeError:
+        return row_bytes((item,))
+
+
+def format_line(snapshot):
+    """One log line summarizing a stage snapshot."""
+    first = snapshot['first_row_seconds']
+    return (
+        f"[{snapshot['stage']}] rows={snapshot['rows']} "
+        f"batches={snapshot['batches']} "
+        f"rows/s={snapshot['rows_per_second']:.0f} "
+        f"bytes/s={snapshot['bytes_per_second']:.0f} "
+        f"blocked={snapshot['blocked_seconds']:.2f}s "
+        f"consumer={snapshot['consumer_seconds']:.2f}s "
+        f"first_row={'-' if first is None else f'{first:.3f}s'}"
+    )
+
+
+def enable(log_interval=LOG_INTERVAL):
+    """Turn instrumentation on for generators started from now on."""
+    global _enabled, _log_interval
+    _enabled = True
+    _log_interval = log_interval
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    """Forget all recorded stages."""
+    with _stages_lock:
+        _stages.clear()
+
+
+def get_stage(name):
+    with _stages_lock:
+        if name not in _stages:
+            _stages[name] = StageMetrics(name)
+        return _stages[name]
+
+
+def snapshot():
+    """:return: {stage name: stage snapshot dict} for every recorded stage"""
+    with _stages_lock:
+        stages = list(_stages.values())
+    return {stage.name: stage.snapshot() for stage in stages}
+
+
+def instrumented(name, source):
+    """
+    Generator that passes the items of `source` through while timing how
+    long each next() blocks and how long the consumer holds each item.
+    """
+    stage = get_stage(name)
+    iterator = iter(source)
+    start = time.perf_counter()
+    try:
+        while True:
+            before = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            after = time.perf_counter()
+            stage.record(item, after - before, after - start)
+            yield item
+            stage.record_consumer(time.perf_counter() - after)
+    finally:
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            close()
+
+
+def instrument(name):
+    """
+    Decorator for generator functions: when instrumentation is enabled the
+    returned generator is wrapped with instrumented(name, ...).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            source = func(*args, **kwargs)
+            if not _enabled:
+                return source
+            return instrumented(name, source)
+        return wrapper
+    return decorator
@@ -0,0 +1,54 @@
+import queue
+import threading
+
+_ITEM, _DONE, _ERROR = 'item', 'done', 'error'
+
+
+def prefetched(source, depth=1):
+    """
+    Generator that runs `source` on a background thread up to `depth`
+    items ahead of the consumer, so fetching item N+1 overlaps with the
+    caller processing item N.
+
+    Closing this generator early stops the thread and closes `source`
+    on it, which hands any pooled connection back.
+    :param source: Generator to read ahead, e.g. stream_users_in_batches()
+    :param depth: Maximum number of items buffered ahead of the consumer
+    :yield: The items of `source`, in order
+    """
+    out = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(message):
+        while not stop.is_set():
+            try:
+                out.put(message, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in source:
+                if not put((_ITEM, item)):
+                    return
+            put((_DONE, None))
+        except BaseException as e:
+            put((_ERROR, e))
+        finally:
+            source.close()
+
+    worker = threading.Thread(target=produce, name='prefetch', daemon=True)
+    worker.start()
+    try:
+        while True:
+            kind, payload = out.get()
+            if kind == _DONE:
+                break
+            if kind == _ERROR:
+                raise payload
+            yield payload
+    finally:
+        stop.set()
+        worker.join()
@@ -2,6 +2,20 @@ import mysql.connector
 from mysql.connector import Error
 import uuid
 import csv
+import time
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+# Rows sent per executemany round trip, and rows per commit
+BATCH_SIZE = 1000
+COMMIT_EVERY = 50000
+
+# Incremental sync: state file and average rows per content-defined chunk
+SYNC_STATE_FILE = "user_data.sync.json"
+CHUNK_TARGET = 256
 
 # Connect to MySQL server
 def connect_db():
@@ -42,14 +56,16 @@ def connect_to_prodev():
         return None
 
 # Create user_data table
-def create_table(connection):
-    query = """
+# binary_ids stores user_id as the 16 raw UUID bytes instead of 36 characters
+def create_table(connection, binary_ids=False):
+    id_type = "BINARY(16)" if binary_ids else "CHAR(36)"
+    query = f"""
     CREATE TABLE IF NOT EXISTS user_data (
-        user_id CHAR(36) PRIMARY KEY,
+        user_id {id_type} PRIMARY KEY,
         name VARCHAR(255) NOT NULL,
         email VARCHAR(255) NOT NULL,
         age DECIMAL(3,0) NOT NULL,
-        INDEX(user_id)
+        UNIQUE KEY uq_user_data_email (email)
     )
     """
     cursor = connection.cursor()
@@ -57,6 +73,42 @@ def create_table(connection):
     print("Table user_data ensured.")
 
 
+# Drop the secondary INDEX(user_id) older tables were created with;
+# the primary key already indexes user_id
+def drop_redundant_user_id_index(connection):
+    cursor = connection.cursor()
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = 'user_data' "
+        "AND index_name = 'user_id'"
+    )
+    if cursor.fetchone()[0]:
+        cursor.execute("ALTER TABLE user_data DROP INDEX user_id")
+        print("Redundant index on user_data.user_id dropped.")
+    cursor.close()
+
+
+# New user_id in the column format chosen in create_table()
+def new_user_id(binary_ids=False):
+    return uuid.uuid4().bytes if binary_ids else str(uuid.uuid4())
+
+
+# Add the unique email index to a table created before it existed
+def ensure_email_index(connection):
+    cursor = connection.cursor()
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = 'user_data' "
+        "AND index_name = 'uq_user_data_email'"
+    )
+    if cursor.fetchone()[0] == 0:
+        cursor.execute(
+            "ALTER TABLE user_data ADD UNIQUE KEY uq_user_data_email (email)"
+        )
+        print("Unique index on user_data.email created.")
+    cursor.close()
+
+
 # Insert Data
 def insert_data(connection, data):
     query = """
@@ -88,6 +140,207 @@ def load_csv_data(file_path):
     return data
 
 
+# Stream rows from the CSV without loading the whole file
+def stream_csv_data(file_path):
+    with open(file_path, mode='r', newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        for row in reader:
+            yield row
+
+
+# Bulk insert rows, letting the unique email index reject duplicates
+def bulk_insert_data(connection, rows, batch_size=BATCH_SIZE,
+                     commit_every=COMMIT_EVERY, binary_ids=False):
+    """
+    Insert (name, email, age) rows with batched executemany.
+    Duplicate emails are skipped by INSERT IGNORE against the unique
+    index on email instead of a lookup per row.
+    :param rows: Iterable of (name, email, age), e.g. stream_csv_data()
+    :param batch_size: Rows per executemany call
+    :param commit_every: Rows between commits
+    :param binary_ids: The table stores user_id as BINARY(16)
+    :return: dict with rows read, inserted, skipped, seconds and rows/s
+    """
+    query = """
+    INSERT IGNORE INTO user_data (user_id, name, email, age)
+    VALUES (%s, %s, %s, %s)
+    """
+    cursor = connection.cursor()
+    start = time.perf_counter()
+    read = inserted = uncommitted = 0
+    batch = []
+
+    def flush():
+        nonlocal inserted, uncommitted
+        cursor.executemany(query, batch)
+        inserted += cursor.rowcount
+        uncommitted += len(batch)
+        batch.clear()
+        if uncommitted >= commit_every:
+            connection.commit()
+            uncommitted = 0
+
+    for name, email, age in rows:
+        batch.append((new_user_id(binary_ids), name, email, age))
+        read += 1
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    connection.commit()
+    cursor.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        'read': read,
+        'inserted': inserted,
+        'skipped': read - inserted,
+        'seconds': elapsed,
+        'rows_per_second': read / elapsed if elapsed else 0.0,
+    }
+
+
+# Load the CSV server side with LOAD DATA LOCAL INFILE
+def load_data_infile(connection, file_path, binary_ids=False):
+    """
+    Fastest path for very large files. Needs local_infile enabled on the
+    server and allow_local_infile=True on the connection.
+    :return: dict with rows inserted, seconds and rows/s
+    """
+    new_id = "UUID_TO_BIN(UUID())" if binary_ids else "UUID()"
+    query = f"""
+    LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE user_data
+    FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+    LINES TERMINATED BY '\\n'
+    IGNORE 1 LINES
+    (name, email, age)
+    SET user_id = {new_id}
+    """
+    cursor = connection.cursor()
+    start = time.perf_counter()
+    cursor.execute(query, (file_path,))
+    inserted = cursor.rowcount
+    connection.commit()
+    cursor.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        'inserted': inserted,
+        'seconds': elapsed,
+        'rows_per_second': inserted / elapsed if elapsed else 0.0,
+    }
+
+
+# Fingerprint of one CSV row
+def row_digest(row):
+    return hashlib.blake2b("\x1f".join(row).encode(), digest_size=16).digest()
+
+
+# Split rows into content-defined chunks
+def content_chunks(rows, target=CHUNK_TARGET):
+    """
+    Group rows into chunks whose boundaries depend on row content, not
+    position: a chunk ends after any row whose digest is divisible by
+    `target`. Inserting or removing a row therefore only changes the
+    chunk around it, and the following chunks hash the same as before.
+    :yield: (chunk digest, list of rows)
+    """
+    chunk, chunk_hash = [], hashlib.blake2b(digest_size=16)
+    for row in rows:
+        digest = row_digest(row)
+        chunk.append(row)
+        chunk_hash.update(digest)
+        if int.from_bytes(digest[:4], 'big') % target == 0 or len(chunk) >= 8 * target:
+            yield chunk_hash.hexdigest(), chunk
+            chunk, chunk_hash = [], hashlib.blake2b(digest_size=16)
+    if chunk:
+        yield chunk_hash.hexdigest(), chunk
+
+
+def load_sync_state(state_path):
+    if not os.path.exists(state_path):
+        return set()
+    with open(state_path) as file:
+        return set(json.load(file)['chunks'])
+
+
+def save_sync_state(state_path, chunks):
+    directory = os.path.dirname(os.path.abspath(state_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as file:
+        json.dump({'chunks': sorted(chunks)}, file)
+    os.replace(tmp_path, state_path)
+
+
+# Apply only the CSV chunks that changed since the last run
+def incremental_sync(connection, file_path, state_path=SYNC_STATE_FILE,
+                     batch_size=BATCH_SIZE, commit_every=COMMIT_EVERY,
+                     binary_ids=False):
+    """
+    Upsert the rows of every chunk whose fingerprint is not in the state
+    file, keyed on the unique email index, then record the new set of
+    chunk fingerprints. Unchanged chunks cost a hash and nothing else.
+    Rows deleted from the CSV are not deleted from the table.
+    :return: dict with chunks seen/changed, rows read/applied, seconds and rows/s
+    """
+    query = """
+    INSERT INTO user_data (user_id, name, email, age)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE name = VALUES(name), age = VALUES(age)
+    """
+    known = load_sync_state(state_path)
+    seen = set()
+    cursor = connection.cursor()
+    start = time.perf_counter()
+    read = applied = changed = uncommitted = 0
+    batch = []
+
+    def flush():
+        nonlocal uncommitted
+        cursor.executemany(query, batch)
+        uncommitted += len(batch)
+        batch.clear()
+        if uncommitted >= commit_every:
+            connection.commit()
+            uncommitted = 0
+
+    for digest, rows in content_chunks(stream_csv_data(file_path)):
+        seen.add(digest)
+        read += len(rows)
+        if digest in known:
+            continue
+        changed += 1
+        for name, email, age in rows:
+            batch.append((new_user_id(binary_ids), name, email, age))
+            applied += 1
+            if len(batch) >= batch_size:
+                flush()
+    if batch:
+        flush()
+    connection.commit()
+    cursor.close()
+    save_sync_state(state_path, seen)
+
+    elapsed = time.perf_counter() - start
+    return {
+        'chunks': len(seen),
+        'changed_chunks': changed,
+        'read': read,
+        'applied': applied,
+        'seconds': elapsed,
+        'rows_per_second': read / elapsed if elapsed else 0.0,
+    }
+
+
+def print_load_report(report):
+    print(
+        f"Loaded {report.get('read', report['inserted'])} rows in "
+        f"{report['seconds']:.2f}s ({report['rows_per_second']:.0f} rows/s): "
+        f"{report['inserted']} inserted, {report.get('skipped', 0)} duplicates skipped"
+    )
+
+
 # MAIN EXECUTION
 if __name__ == "__main__":
 
@@ -98,8 +351,18 @@ if __name__ == "__main__":
     db_conn = connect_to_prodev()
 
     create_table(db_conn)
+    drop_redundant_user_id_index(db_conn)
+    ensure_email_index(db_conn)
 
-    sample_data = load_csv_data("user_data.csv")
-    insert_data(db_conn, sample_data)
+    if "--incremental" in sys.argv:
+        report = incremental_sync(db_conn, "user_data.csv")
+        print(
+            f"Synced {report['read']} rows in {report['seconds']:.2f}s: "
+            f"{report['changed_chunks']}/{report['chunks']} chunks changed, "
+            f"{report['applied']} rows upserted"
+        )
+    else:
+        report = bulk_insert_data(db_conn, stream_csv_data("user_data.csv"))
+        print_load_report(report)
 
     db_conn.close()
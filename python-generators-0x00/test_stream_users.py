@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import tracemalloc
+import unittest
+from contextlib import contextmanager
+from unittest.mock import patch
+
+stream_users_module = __import__('0-stream_users')
+batch_processing_module = __import__('1-batch_processing')
+
+
+class FakeCursor:
+    """Unbuffered cursor that produces rows lazily, like a server-side stream"""
+
+    def __init__(self, total_rows):
+        self.total_rows = total_rows
+        self.rows = None
+
+    def execute(self, query, params=None):
+        self.rows = ((f"{i:036d}", "name", "user@example.com", i % 100)
+                     for i in range(self.total_rows))
+
+    def fetchmany(self, size):
+        batch = []
+        for row in self.rows:
+            batch.append(row)
+            if len(batch) == size:
+                break
+        return batch
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    """Pool handing out a single connection backed by FakeCursor"""
+
+    def __init__(self, total_rows):
+        self.total_rows = total_rows
+        self.cursor_kwargs = None
+
+    @contextmanager
+    def connection(self):
+        pool = self
+
+        class Connection:
+            def cursor(self, **kwargs):
+                pool.cursor_kwargs = kwargs
+                return FakeCursor(pool.total_rows)
+
+        yield Connection()
+
+
+def peak_memory(consume, total_rows):
+    """Return the tracemalloc peak while consume() drains total_rows rows"""
+    tracemalloc.start()
+    try:
+        consume(FakePool(total_rows))
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+class TestStreamingMemory(unittest.TestCase):
+    """Peak memory of streaming mode must not grow with the table size"""
+
+    def drain_users(self, pool):
+        with patch.object(stream_users_module, 'get_pool', return_value=pool):
+            count = sum(1 for _ in stream_users_module.stream_users(
+                streaming=True, prefetch=500))
+        self.assertEqual(count, pool.total_rows)
+        self.assertEqual(pool.cursor_kwargs, {'buffered': False})
+
+    def drain_batches(self, pool):
+        with patch.object(batch_processing_module, 'get_pool', return_value=pool):
+            count = sum(len(batch) for batch in
+                        batch_processing_module.stream_users_in_batches(
+                            500, streaming=True))
+        self.assertEqual(count, pool.total_rows)
+        self.assertEqual(pool.cursor_kwargs, {'buffered': False})
+
+    def test_stream_users_peak_is_flat(self):
+        """stream_users peak memory is the same for 10k and 200k rows"""
+        small = peak_memory(self.drain_users, 10_000)
+        large = peak_memory(self.drain_users, 200_000)
+        self.assertLess(large, small * 1.5)
+
+    def test_stream_users_in_batches_peak_is_flat(self):
+        """stream_users_in_batches peak memory is the same for 10k and 200k rows"""
+        small = peak_memory(self.drain_batches, 10_000)
+        large = peak_memory(self.drain_batches, 200_000)
+        self.assertLess(large, small * 1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
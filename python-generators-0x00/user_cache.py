@@ -0,0 +1,197 @@
+import sys
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+from db_pool import get_pool
+from partitioned_scan import key_ranges, scan_range
+from user_row import UserRow, encode_user_id
+
+PARTITIONS = 64             # Key ranges checksummed independently on refresh
+# Seconds between background refreshes. Each refresh checksums every range,
+# which reads the whole table on the server (a full scan), so keep this long
+REFRESH_INTERVAL = 3600.0
+MAX_BYTES = 512 * 1024 ** 2  # Refuse to grow the cache past this estimate
+BATCH_SIZE = 5000
+
+
+def _range_clause(low, high):
+    clauses, params = [], []
+    if low is not None:
+        clauses.append("user_id >= %s")
+        params.append(low)
+    if high is not None:
+        clauses.append("user_id < %s")
+        params.append(high)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def _row_bytes(user):
+    return (sys.getsizeof(user) + sys.getsizeof(user.user_id) + sys.getsizeof(user.name)
+            + sys.getsizeof(user.email) + sys.getsizeof(user.age))
+
+
+class UserCache:
+    """
+    In-memory copy of user_data indexed by email, by user_id and by age.
+
+    The table is cut into `partitions` user_id ranges. refresh() asks MySQL
+    for a row count and checksum of every range and reloads only the
+    ranges whose checksum moved, so only changed rows cross the wire.
+    The checksums themselves still read every row on the server, so each
+    refresh costs a full table scan there whatever the size of the change.
+    """
+
+    def __init__(self, partitions=PARTITIONS, max_bytes=MAX_BYTES, binary_ids=False):
+        self.ranges = key_ranges(partitions, binary_ids)
+        self.max_bytes = max_bytes
+        self._checksums = [None] * len(self.ranges)
+        self._range_ids = [[] for _ in self.ranges]
+        self._by_id = {}
+        self._by_email = {}
+        self._by_age = {}           # age -> sorted list of user_id bytes
+        self._ages = []             # sorted distinct ages present
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._timer = None
+
+    # -- loading --------------------------------------------------------
+
+    def _checksum_query(self, cursor, low, high):
+        where, params = _range_clause(low, high)
+        cursor.execute(
+            "SELECT COUNT(*), COALESCE(BIT_XOR(CRC32(CONCAT_WS('|', "
+            "HEX(user_id), name, email, age))), 0) FROM user_data" + where,
+            params
+        )
+        return tuple(int(value) for value in cursor.fetchone())
+
+    def _fetch_range(self, connection, low, high):
+        users = []
+        for rows in scan_range(None, low, high, BATCH_SIZE, connection=connection):
+            users.extend(UserRow.from_db(row) for row in rows)
+        return users
+
+    def _remove(self, user):
+        del self._by_id[user.user_id]
+        if self._by_email.get(user.email) is user:
+            del self._by_email[user.email]
+        ids = self._by_age[user.age]
+        del ids[bisect_left(ids, user.user_id)]
+        if not ids:
+            del self._by_age[user.age]
+            del self._ages[bisect_left(self._ages, user.age)]
+        self._bytes -= _row_bytes(user)
+
+    def _add(self, user):
+        self._by_id[user.user_id] = user
+        self._by_email[user.email] = user
+        if user.age not in self._by_age:
+            self._by_age[user.age] = []
+            insort(self._ages, user.age)
+        insort(self._by_age[user.age], user.user_id)
+        self._bytes += _row_bytes(user)
+
+    def _replace_range(self, index, users):
+        added = sum(_row_bytes(user) for user in users)
+        removed = sum(_row_bytes(self._by_id[i]) for i in self._range_ids[index])
+        if self._bytes + added - removed > self.max_bytes:
+            raise MemoryError(
+                f"User cache would exceed {self.max_bytes} bytes; "
+                f"raise max_bytes or cache fewer rows"
+            )
+        for user_id in self._range_ids[index]:
+            self._remove(self._by_id[user_id])
+        for user in users:
+            self._add(user)
+        self._range_ids[index] = [user.user_id for user in users]
+
+    def refresh(self):
+        """
+        Reload every range whose checksum changed since the last refresh.
+        The first call loads the whole table.
+        :return: Number of ranges reloaded
+        """
+        reloaded = 0
+        with get_pool().connection() as connection:
+            cursor = connection.cursor()
+            for index, (low, high) in enumerate(self.ranges):
+                # Checksum and rows come from the same consistent snapshot
+                connection.start_transaction(consistent_snapshot=True, readonly=True)
+                try:
+                    checksum = self._checksum_query(cursor, low, high)
+                    if checksum == self._checksums[index]:
+                        continue
+                    users = self._fetch_range(connection, low, high)
+                finally:
+                    connection.rollback()
+                with self._lock:
+                    self._replace_range(index, users)
+                    self._checksums[index] = checksum
+                reloaded += 1
+            cursor.close()
+        return reloaded
+
+    def start_refresher(self, interval=REFRESH_INTERVAL):
+        """Refresh in a background thread every `interval` seconds."""
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing user cache: {e}")
+            with self._lock:
+                if self._timer is not None:
+                    self._schedule(run, interval)
+
+        with self._lock:
+            self._schedule(run, interval)
+
+    def _schedule(self, run, interval):
+        self._timer = threading.Timer(interval, run)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def stop_refresher(self):
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+
+    # -- lookups --------------------------------------------------------
+
+    def get(self, user_id):
+        """:return: UserRow for a user_id (string or bytes), or None"""
+        with self._lock:
+            return self._by_id.get(encode_user_id(user_id))
+
+    def get_by_email(self, email):
+        """:return: UserRow with this email, or None"""
+        with self._lock:
+            return self._by_email.get(email)
+
+    def ids_by_age(self, age):
+        """:return: Sorted list of 16-byte user_ids with exactly this age"""
+        with self._lock:
+            return list(self._by_age.get(age, ()))
+
+    def users_by_age(self, low, high):
+        """:return: UserRows with low <= age <= high, ordered by age"""
+        with self._lock:
+            ages = self._ages[bisect_left(self._ages, low):bisect_right(self._ages, high)]
+            return [self._by_id[i] for age in ages for i in self._by_age[age]]
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def memory_usage(self):
+        """:return: dict with row count and estimated bytes per structure"""
+        with self._lock:
+            index_bytes = (sys.getsizeof(self._by_id) + sys.getsizeof(self._by_email)
+                           + sys.getsizeof(self._by_age)
+                           + sum(sys.getsizeof(ids) for ids in self._by_age.values()))
+            return {
+                'rows': len(self._by_id),
+                'row_bytes': self._bytes,
+                'index_bytes': index_bytes,
+                'total_bytes': self._bytes + index_bytes,
+                'max_bytes': self.max_bytes,
+            }
@@ -0,0 +1,66 @@
+import uuid
+
+
+def decode_user_id(value):
+    """
+    Return user_id as the canonical 36-character string, whether the
+    table stores it as CHAR(36) or BINARY(16).
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return str(uuid.UUID(bytes=bytes(value)))
+    return value
+
+
+def encode_user_id(value):
+    """Return the 16-byte form of a user_id for BINARY(16) columns."""
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    return uuid.UUID(value).bytes
+
+
+def convert_row(row):
+    """
+    Normalize a (user_id, name, email, age) row: string user_id and an
+    int age instead of Decimal.
+    """
+    user_id, name, email, age = row
+    return decode_user_id(user_id), name, email, int(age)
+
+
+class UserRow:
+    """
+    Compact user record. With __slots__ an instance needs no per-object
+    __dict__, so it is smaller than a dict and still has named fields.
+    user_id is kept in its 16-byte form; `uuid` gives the string.
+    """
+
+    __slots__ = ('user_id', 'name', 'email', 'age')
+
+    def __init__(self, user_id, name, email, age):
+        self.user_id = user_id
+        self.name = name
+        self.email = email
+        self.age = age
+
+    @classmethod
+    def from_db(cls, row):
+        """Build a UserRow from a (user_id, name, email, age) database row."""
+        user_id, name, email, age = row
+        return cls(encode_user_id(user_id), name, email, int(age))
+
+    @property
+    def uuid(self):
+        return str(uuid.UUID(bytes=self.user_id))
+
+    def __iter__(self):
+        return iter((self.user_id, self.name, self.email, self.age))
+
+    def __eq__(self, other):
+        return isinstance(other, UserRow) and tuple(self) == tuple(other)
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return (f"UserRow(user_id={self.uuid!r}, name={self.name!r}, "
+                f"email={self.email!r}, age={self.age!r})")